@@ -9,6 +9,8 @@ RESULTS_DIR = os.path.join(ROOT_DIR, 'results')
 CONFIG_PATH = os.path.join(CODE_DIR, 'config.yaml')
 FIGURES_DIR = os.path.join(RESULTS_DIR, 'figures')
 PLOTS_DIR = os.path.join(RESULTS_DIR, 'plots')
+DATASETS_DIR = os.path.join(RESULTS_DIR, 'datasets')
+COST2100_BANKS_DIR = os.path.join(RESULTS_DIR, 'cost2100_banks')
 CONFIG_RUNS_DIR = os.path.join(RESOURCES_DIR, 'config_runs')
 COST2100_DIR = os.path.join(RESOURCES_DIR, 'cost2100_channel')
 SISO_COST2100_DIR = os.path.join(COST2100_DIR, 'SISO')
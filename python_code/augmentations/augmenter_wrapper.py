@@ -1,4 +1,4 @@
-from typing import Tuple, List
+from typing import Tuple, List, Optional
 
 import torch
 
@@ -15,12 +15,9 @@ from python_code.utils.trellis_utils import calculate_siso_states, calculate_mim
 conf = Config()
 
 
-def estimate_params(rx: torch.Tensor, tx: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, int, int]:
+def calculate_pilots_states(tx: torch.Tensor) -> Tuple[torch.Tensor, int, int]:
     """
-    Estimate parameters of centers and stds in the jth step based on the known states of the pilots.
-    :param rx: received pilots word
-    :param tx: transmitted pilots word
-    :return: updated centers and stds values per class
+    Calculates the states of the pilots, along with the number of states and the size of each state.
     """
     if conf.channel_type == ChannelModes.SISO.name:
         gt_states = calculate_siso_states(MEMORY_LENGTH, tx)
@@ -32,30 +29,141 @@ def estimate_params(rx: torch.Tensor, tx: torch.Tensor) -> Tuple[torch.Tensor, t
         state_size = N_ANT
     else:
         raise ValueError("No such channel type!!!")
+    return gt_states, n_states, state_size
 
-    centers = torch.empty([n_states, *rx.shape[1:]]).to(DEVICE)
-    stds = torch.empty([n_states, *rx.shape[1:]]).to(DEVICE)
 
-    for state in range(n_states):
-        state_ind = (gt_states == state)
-        state_received = rx[state_ind]
-        if state_received.shape[0] > 0:
-            stds[state] = torch.std(state_received, dim=0)
-            centers[state] = torch.mean(state_received.real, dim=0)
-        else:
-            centers[state] = 0
+def calculate_states_moments(rx: torch.Tensor, gt_states: torch.Tensor, n_states: int) -> Tuple[
+    torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Calculates the count, mean and sum of squared deviations of the received words of every state, by scatter
+    reductions over the states instead of a pass per state.
+    :param rx: received words, [batch_size, rx_size]
+    :param gt_states: the states of the words
+    :param n_states: number of states
+    :return: counts [n_states], means and sums of squared deviations [n_states, rx_size]
+    """
+    counts = torch.bincount(gt_states, minlength=n_states)
+    sums = torch.zeros([n_states, rx.shape[1]], dtype=rx.dtype).to(DEVICE).index_add_(0, gt_states, rx)
+    means = sums / counts.clamp(min=1).unsqueeze(-1)
+    squared_deviations = (rx - means[gt_states]) ** 2
+    m2 = torch.zeros([n_states, rx.shape[1]], dtype=rx.dtype).to(DEVICE).index_add_(0, gt_states, squared_deviations)
+    return counts, means, m2
+
+
+def moments_to_params(counts: torch.Tensor, means: torch.Tensor, m2: torch.Tensor, rx_shape: torch.Size) -> Tuple[
+    torch.Tensor, torch.Tensor]:
+    """
+    Converts the moments per state to the centers and (unbiased) stds per state. States with less than two samples
+    get the average std of the rest, and states with no samples are centered at 0.
+    """
+    counts = counts.unsqueeze(-1)
+    centers = torch.where(counts > 0, means, torch.zeros_like(means)).float().reshape(-1, *rx_shape)
+    stds = torch.sqrt(m2 / (counts - 1).clamp(min=1)).float()
+    stds = torch.where(counts > 1, stds, torch.full_like(stds, float('nan'))).reshape(-1, *rx_shape)
     stds[torch.isnan(stds)] = torch.mean(stds[~torch.isnan(stds)])
+    return centers, stds
+
+
+def estimate_params(rx: torch.Tensor, tx: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, int, int]:
+    """
+    Estimate parameters of centers and stds in the jth step based on the known states of the pilots.
+    :param rx: received pilots word
+    :param tx: transmitted pilots word
+    :return: updated centers and stds values per class
+    """
+    gt_states, n_states, state_size = calculate_pilots_states(tx)
+    counts, means, m2 = calculate_states_moments(rx.reshape(rx.shape[0], -1), gt_states, n_states)
+    centers, stds = moments_to_params(counts, means, m2, rx.shape[1:])
     return centers, stds, gt_states, n_states, state_size
 
 
+class StreamingParamsEstimator:
+    """
+    Streaming version of estimate_params. Accumulates the per-state moments of the pilots chunk by chunk with
+    Welford's (parallel) update, so the statistics are available without keeping the pilots.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._counts, self._means, self._m2 = None, None, None
+        self._rx_shape, self._n_states, self._state_size = None, None, None
+
+    def update(self, rx: torch.Tensor, tx: torch.Tensor):
+        """
+        Adds a chunk of pilots to the accumulated statistics
+        :param rx: received pilots chunk
+        :param tx: transmitted pilots chunk
+        """
+        gt_states, self._n_states, self._state_size = calculate_pilots_states(tx)
+        self._rx_shape = rx.shape[1:]
+        counts, means, m2 = calculate_states_moments(rx.reshape(rx.shape[0], -1).double(), gt_states,
+                                                     self._n_states)
+        if self._counts is None:
+            self._counts, self._means, self._m2 = counts, means, m2
+            return
+        # merge the moments of the chunk into the accumulated ones
+        total_counts = self._counts + counts
+        ratio = (counts / total_counts.clamp(min=1)).unsqueeze(-1)
+        delta = means - self._means
+        self._means = self._means + delta * ratio
+        self._m2 = self._m2 + m2 + delta ** 2 * self._counts.unsqueeze(-1) * ratio
+        self._counts = total_counts
+
+    def estimate(self) -> Tuple[torch.Tensor, torch.Tensor, int, int]:
+        """
+        :return: centers and stds values per class, the number of states and the size of each state
+        """
+        if self._counts is None:
+            raise ValueError("No pilots were accumulated!")
+        centers, stds = moments_to_params(self._counts, self._means, self._m2, self._rx_shape)
+        return centers, stds, self._n_states, self._state_size
+
+    @property
+    def counts(self) -> torch.Tensor:
+        return self._counts
+
+
+def estimate_covariances(rx: torch.Tensor, gt_states: torch.Tensor, centers: torch.Tensor,
+                         stds: torch.Tensor) -> torch.Tensor:
+    """
+    Estimate the full covariance of the received words of each class, flattened over the antennas (and the real and
+    imaginary parts). Classes with too few pilots fall back to the diagonal covariance of the given stds.
+    :param rx: received pilots word
+    :param gt_states: the states of the pilots
+    :param centers: centers per class
+    :param stds: stds per class
+    :return: covariances per class, [n_states, rx_size, rx_size]
+    """
+    n_states = centers.shape[0]
+    flat_centers, flat_stds = centers.reshape(n_states, -1), stds.reshape(n_states, -1)
+    centered_rx = rx.reshape(rx.shape[0], -1).float() - flat_centers[gt_states]
+    outer_products = centered_rx.unsqueeze(2) * centered_rx.unsqueeze(1)
+    covariances = torch.zeros([n_states, *outer_products.shape[1:]]).to(DEVICE)
+    covariances.index_add_(0, gt_states, outer_products)
+    counts = torch.bincount(gt_states, minlength=n_states)
+    covariances /= (counts - 1).clamp(min=1).reshape(-1, 1, 1)
+    sparse_states = counts <= flat_centers.shape[1]
+    covariances[sparse_states] = torch.diag_embed(flat_stds[sparse_states] ** 2)
+    return covariances
+
+
 ALPHA1 = 0.3
 ALPHA2 = 0.3
 
 
 class AugmenterWrapper:
 
-    def __init__(self, augmentations: List[str], fading_in_channel: bool):
+    def __init__(self, augmentations: List[str], fading_in_channel: bool, generator: Optional[torch.Generator] = None):
+        """
+        :param augmentations: the names of the augmentations to apply
+        :param fading_in_channel: whether to smooth the estimated parameters over the blocks
+        :param generator: the generator of the geometric draws, by default seeded by conf.seed, so the drawn samples do
+        not depend on the random draws of the training. Must reside on DEVICE.
+        """
         self._augmentations = augmentations
+        self._generator = torch.Generator(device=DEVICE).manual_seed(conf.seed) if generator is None else generator
         self._fading_in_channel = fading_in_channel
         self._centers = None
         self._stds = None
@@ -73,10 +181,15 @@ class AugmenterWrapper:
 
         self._sampler = NoSampler(received_words, transmitted_words)
 
+        covariances = None
+        if conf.geometric_full_covariance:
+            covariances = estimate_covariances(received_words, gt_states, self._centers, self._stds)
+
         self._augmenters_dict = {
             'rotation_augmenter': RotationAugmenter(),
             'translation_augmenter': TranslationAugmenter(self._centers),
-            'geometric_augmenter': GeometricAugmenter(self._centers, self._stds, n_states, state_size, gt_states),
+            'geometric_augmenter': GeometricAugmenter(self._centers, self._stds, n_states, state_size, gt_states,
+                                                      covariances, self._generator),
         }
 
         self._n_states = n_states
@@ -106,67 +219,49 @@ class AugmenterWrapper:
     def n_states(self) -> int:
         return self._n_states
 
-    def augment_single(self, i: int, h: torch.Tensor, snr: float) -> Tuple[torch.Tensor, torch.Tensor]:
-        """
-        Augment the received word using one of the given augmentations methods.
-        :param i: current repetition index
-        :param h: channel coefficients
-        :param snr: signal-to-noise ratio
-        :return: the augmented received and transmitted pairs
-        """
-        aug_rxs, aug_txs = [], []
-        # sample via the sampling method
-        rx, tx = self._sampler.sample(i, h, snr)
-        if len(self._augmentations) == 0:
-            return rx, tx
-
-        # run through the desired augmentations
-        for augmentation_name in self._augmentations:
-            augmenter = self._augmenters_dict[augmentation_name]
-            aug_rx, aug_tx = augmenter.augment(rx.clone(), tx.clone())
-            aug_rxs.append(aug_rx), aug_txs.append(aug_tx)
-
-        reshaped_aug_txs = torch.cat(aug_txs).to(DEVICE).reshape(self.active_augmentations_num, -1)
-        if conf.modulation_type == ModulationType.QPSK.name:
-            return torch.cat(aug_rxs).to(DEVICE).reshape(self.active_augmentations_num, -1, 2), reshaped_aug_txs
-        else:
-            return torch.cat(aug_rxs).to(DEVICE).reshape(self.active_augmentations_num, -1), reshaped_aug_txs
-
     def augment_batch(self, h: torch.Tensor, rx: torch.Tensor, tx: torch.Tensor):
         """
         The main augmentation function, used to augment each pilot in the evaluation phase.
+        All the synthesized samples are drawn at once, each augmenter is run once on its share of the batch.
         :param h: channel coefficients
         :param rx: received word
         :param tx: transmitted word
         :return: the augmented batch of (rx,tx)
         """
-        aug_tx = torch.empty([(1 + self.active_augmentations_num * conf.online_repeats_n) * tx.shape[0],
-                              tx.shape[1]]).to(DEVICE)
-        if conf.modulation_type == ModulationType.QPSK.name:
-            rx = torch.view_as_real(rx)
-        aug_rx = torch.empty(
-            [(1 + self.active_augmentations_num * conf.online_repeats_n) * rx.shape[0], *rx.shape[1:]],
-            dtype=rx.dtype).to(DEVICE)
-        i = 0
-        while i < aug_rx.shape[0]:
-            # copy |Q| first samples into Q*
-            if i < rx.shape[0]:
-                aug_rx[i], aug_tx[i] = rx[i], tx[i]
-                i += 1
-            # synthesize the rest of samples in Q*
-            else:
-                cur_aug_rx, cur_aug_tx = self.augment_single(i, h, conf.val_snr)
-                # if SISO, order of samples matters. so place only 1 sample out randomly of the active augmentations.
-                if conf.channel_type == ChannelModes.SISO.name:
-                    j = (i // tx.shape[0]) % self.active_augmentations_num
-                    aug_rx[i] = cur_aug_rx[j]
-                    aug_tx[i] = cur_aug_tx[j]
-                    i += 1
-                else:
-                    aug_rx[i:i + self.active_augmentations_num] = cur_aug_rx
-                    aug_tx[i:i + self.active_augmentations_num] = cur_aug_tx
-                    i += self.active_augmentations_num
+        pilots_num = tx.shape[0]
+        total_size = (1 + self.active_augmentations_num * conf.online_repeats_n) * pilots_num
+        aug_tx = torch.empty([total_size, tx.shape[1]]).to(DEVICE)
+        aug_rx = torch.empty([total_size, *rx.shape[1:]], dtype=rx.dtype).to(DEVICE)
+        # the augmenters operate on the real view of complex words, write through it to avoid conversions
+        rx_real = torch.view_as_real(rx) if rx.is_complex() else rx
+        aug_rx_real = torch.view_as_real(aug_rx) if aug_rx.is_complex() else aug_rx
+        # copy |Q| first samples into Q*
+        aug_rx_real[:pilots_num], aug_tx[:pilots_num] = rx_real, tx
+        # synthesize the rest of samples in Q*
+        slots = torch.arange(pilots_num, total_size).to(DEVICE)
+        if conf.channel_type == ChannelModes.SISO.name:
+            # if SISO, order of samples matters. so each slot is synthesized by a single augmentation
+            sample_inds = self._sampler.sample_indices(slots)
+            augmentation_inds = (slots // pilots_num) % self.active_augmentations_num
+        elif conf.channel_type == ChannelModes.MIMO.name:
+            # if MIMO, a sampled pilot is augmented by all augmentations into a contiguous group of slots
+            group_slots = slots[::self.active_augmentations_num]
+            sample_inds = self._sampler.sample_indices(group_slots).repeat_interleave(
+                self.active_augmentations_num)
+            augmentation_inds = (slots - pilots_num) % self.active_augmentations_num
+        else:
+            raise ValueError("No such channel type!!!")
 
-        if conf.modulation_type == ModulationType.QPSK.name:
-            aug_rx = torch.view_as_complex(aug_rx)
+        if len(self._augmentations) == 0:
+            aug_rx_real[slots], aug_tx[slots] = rx_real[sample_inds], tx[sample_inds]
+            return aug_rx, aug_tx
+
+        # run through the desired augmentations
+        for j, augmentation_name in enumerate(self._augmentations):
+            augmenter = self._augmenters_dict[augmentation_name]
+            cur_slots = augmentation_inds == j
+            cur_sample_inds = sample_inds[cur_slots]
+            cur_aug_rx, cur_aug_tx = augmenter.augment(rx_real[cur_sample_inds], tx[cur_sample_inds])
+            aug_rx_real[slots[cur_slots]] = cur_aug_rx.to(aug_rx_real.dtype)
+            aug_tx[slots[cur_slots]] = cur_aug_tx.to(aug_tx.dtype)
         return aug_rx, aug_tx
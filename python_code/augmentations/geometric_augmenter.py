@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import Tuple, Optional
 
 import torch
 
@@ -10,39 +10,59 @@ from python_code.utils.trellis_utils import calculate_siso_states, calculate_mim
 
 conf = Config()
 
+COVARIANCE_JITTER = 1e-6
+
 
 class GeometricAugmenter:
     """
     A proposed augmentations scheme. Based on the calculated centers and variances for each class, it draws samples.
+    If the per-class covariances are given, it draws with the full covariance instead of the diagonal stds.
     """
 
     def __init__(self, centers: torch.Tensor, stds: torch.Tensor, n_states: int, state_size: int,
-                 gt_states: torch.Tensor):
+                 gt_states: torch.Tensor, covariances: Optional[torch.Tensor] = None,
+                 generator: Optional[torch.Generator] = None):
         super().__init__()
         self._centers = centers
         self._stds = stds
         self._n_states = n_states
         self._state_size = state_size
         self._gt_states = gt_states
+        self._generator = generator
+        self._cholesky_factors = None
+        if covariances is not None:
+            # cache the cholesky factor of each class, so sampling is a single batched matmul
+            jitter = COVARIANCE_JITTER * torch.eye(covariances.shape[-1]).to(DEVICE)
+            self._cholesky_factors, _ = torch.linalg.cholesky_ex(covariances + jitter)
 
     def augment(self, rx: torch.Tensor, tx: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Draws a new received sample around the center of the state of each transmitted word
+        :param rx: received words, [batch_size, ...]
+        :param tx: transmitted words, [batch_size, tx_length]
+        :return: the augmented (rx,tx) pairs
+        """
         if conf.channel_type == ChannelModes.SISO.name:
-            to_augment_state = calculate_siso_states(MEMORY_LENGTH, tx)[0]
+            to_augment_states = calculate_siso_states(MEMORY_LENGTH, tx)
         elif conf.channel_type == ChannelModes.MIMO.name:
-            to_augment_state = calculate_mimo_states(N_USER, tx)[0]
+            to_augment_states = calculate_mimo_states(N_USER, tx)
         else:
             raise ValueError("No such channel type!!!")
+        return self.sample_batch(to_augment_states, self._generator), tx
 
-        if conf.channel_type == ChannelModes.SISO.name:
-            rx = self._centers[to_augment_state] + self._stds[to_augment_state] * torch.randn(
-                [1, self._state_size]).to(DEVICE)
-        elif conf.channel_type == ChannelModes.MIMO.name:
-            rx = self._centers[to_augment_state] + self._stds[to_augment_state] * torch.randn(
-                self._centers[to_augment_state].shape).to(DEVICE)
-            rx = rx.unsqueeze(0)
-        else:
-            raise ValueError("No such channel type!!!")
-        return rx, tx
+    def sample_batch(self, states: torch.Tensor, generator: Optional[torch.Generator] = None) -> torch.Tensor:
+        """
+        Draws a synthetic received word for each of the given states, with a single call to the random generator
+        :param states: the states to draw for, [batch_size]
+        :param generator: optional generator for reproducible draws, must reside on DEVICE
+        :return: the drawn received words, [batch_size, ...]
+        """
+        centers = self._centers[states]
+        noise = torch.randn(centers.shape, generator=generator, device=DEVICE)
+        if self._cholesky_factors is None:
+            return centers + self._stds[states] * noise
+        correlated_noise = torch.matmul(self._cholesky_factors[states], noise.reshape(states.shape[0], -1, 1))
+        return centers + correlated_noise.reshape(centers.shape)
 
     @property
     def centers(self) -> torch.Tensor:
@@ -1,17 +1,15 @@
-from random import randint
-from typing import Tuple
-
 import torch
 
+from python_code import DEVICE
 from python_code.utils.config_singleton import Config
-from python_code.utils.constants import ChannelModes, ModulationType
+from python_code.utils.constants import ChannelModes
 
 conf = Config()
 
 
 class NoSampler:
     """
-    No sampling approach. Return the sample by index / randomly.
+    No sampling approach. Return the samples by index / randomly.
     """
 
     def __init__(self, received_words: torch.Tensor, transmitted_words: torch.Tensor):
@@ -19,16 +17,15 @@ class NoSampler:
         self._received_words = received_words
         self._transmitted_words = transmitted_words
 
-    def sample(self, i: int, h: torch.Tensor, snr: float) -> Tuple[torch.Tensor, torch.Tensor]:
+    def sample_indices(self, slots: torch.Tensor) -> torch.Tensor:
+        """
+        Draws the pilot index to be used for each of the given slots of the augmented batch
+        :param slots: indices of the slots in the augmented batch
+        :return: pilot indices, same shape as slots
+        """
         if conf.channel_type == ChannelModes.SISO.name:
-            ind = i % self._received_words.shape[0]
+            return slots % self._received_words.shape[0]
         elif conf.channel_type == ChannelModes.MIMO.name:
-            ind = randint(a=0, b=self._received_words.shape[0] - 1)
+            return torch.randint(self._received_words.shape[0], slots.shape).to(DEVICE)
         else:
             raise ValueError("No such channel type!!!")
-        reshaped_tx = self._transmitted_words[ind].reshape(1, -1)
-        if conf.modulation_type == ModulationType.QPSK.name:
-            reshaped_rx = self._received_words[ind].reshape(1, -1, 2)
-        else:
-            reshaped_rx = self._received_words[ind].reshape(1, -1)
-        return reshaped_rx, reshaped_tx
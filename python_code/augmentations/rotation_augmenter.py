@@ -1,5 +1,4 @@
 import math
-from random import randint
 from typing import Tuple
 
 import torch
@@ -35,25 +34,32 @@ class RotationAugmenter:
         deg_list = list(range(0, DEG_IN_CIRCLE, DEG_IN_CIRCLE // MODULATION_NUM_MAPPING[conf.modulation_type]))
         rad_list = [math.radians(degree) for degree in deg_list]
         self.degrees = torch.Tensor(rad_list).to(DEVICE)
+        # the phasor of each rotation, and the symbols relabeling after it. Row k is the mapping applied k times
+        self._phasors = torch.polar(torch.ones_like(self.degrees), self.degrees)
+        rotation_map = MAPPING_DICT[conf.modulation_type]
+        symbols_maps = [list(range(len(rotation_map)))]
+        for _ in range(1, len(self.degrees)):
+            symbols_maps.append([rotation_map[symbol] for symbol in symbols_maps[-1]])
+        self._symbols_maps = torch.tensor(symbols_maps).to(DEVICE)
 
     def augment(self, rx: torch.Tensor, tx: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
-        random_ind = randint(a=1, b=len(self.degrees) - 1)
-        # choose a random degree
-        chosen_transformation = self.degrees[random_ind]
+        """
+        Rotates each received word by a random constellation-conserving degree, and relabels its symbols accordingly
+        :param rx: received words, [batch_size, ...]. The real view for QPSK.
+        :param tx: transmitted words, [batch_size, tx_length]
+        :return: the augmented (rx,tx) pairs
+        """
+        # choose a random degree per word
+        random_inds = torch.randint(1, len(self.degrees), [rx.shape[0]]).to(DEVICE)
+        # multiply each word by the phasor of its degree
         if conf.modulation_type == ModulationType.BPSK.name:
-            rx = torch.cat([rx.unsqueeze(-1), torch.zeros_like(rx.unsqueeze(-1))],
-                           dim=1)
-            rx = rx[:, :, 0]
-        # add the random degree to the angle of current word
-        new_angle = torch.view_as_complex(rx).angle() + chosen_transformation
-        new_complex_rx = torch.view_as_complex(rx).abs() * (torch.cos(new_angle) + 1j * torch.sin(new_angle))
-        new_rx = torch.view_as_real(new_complex_rx)
-        if conf.modulation_type == ModulationType.BPSK.name:
-            new_rx = new_rx[:, 0].unsqueeze(1)
-
+            phasors = self._phasors.real[random_inds].reshape(-1, *[1] * (rx.dim() - 1))
+            new_rx = phasors * rx
+        elif conf.modulation_type == ModulationType.QPSK.name:
+            phasors = self._phasors[random_inds].reshape(-1, *[1] * (rx.dim() - 2))
+            new_rx = torch.view_as_real(phasors * torch.view_as_complex(rx.contiguous()))
+        else:
+            raise ValueError("No such constellation!")
         # get the desired new class after transformation
-        new_tx = tx
-        map = MAPPING_DICT[conf.modulation_type]
-        for i in range(random_ind):
-            new_tx = torch.tensor([map[x.item()] for x in new_tx[0]]).reshape(tx.shape)
-        return new_rx, new_tx.to(DEVICE)
+        new_tx = self._symbols_maps[random_inds.unsqueeze(-1), tx.long()].to(tx.dtype)
+        return new_rx, new_tx
@@ -1,4 +1,3 @@
-from random import randint
 from typing import Tuple
 
 import torch
@@ -8,7 +7,8 @@ from python_code.augmentations.rotation_augmenter import DEG_IN_CIRCLE
 from python_code.channel.channels_hyperparams import MEMORY_LENGTH, N_USER, MODULATION_NUM_MAPPING
 from python_code.utils.config_singleton import Config
 from python_code.utils.constants import ChannelModes, ModulationType
-from python_code.utils.trellis_utils import calculate_siso_states, calculate_mimo_states
+from python_code.utils.trellis_utils import calculate_siso_states, calculate_mimo_states, \
+    calculate_symbols_from_states
 
 conf = Config()
 
@@ -44,40 +44,62 @@ class TranslationAugmenter:
         super().__init__()
         self._centers = centers
         self.degrees = list(range(0, DEG_IN_CIRCLE, DEG_IN_CIRCLE // MODULATION_NUM_MAPPING[conf.modulation_type]))
+        self._build_translation_tables()
 
-    def augment(self, rx: torch.Tensor, tx: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    def _build_translation_tables(self):
+        """
+        Precomputes for every (source state, shift) the target state and its symbols, the sign-flip applied to the
+        received word and the delta between the centers. Row 0 of the shifts dimension is the identity.
+        """
         if conf.channel_type == ChannelModes.SISO.name:
-            received_word_state = calculate_siso_states(MEMORY_LENGTH, tx)[0]
+            tx_length = MEMORY_LENGTH
         elif conf.channel_type == ChannelModes.MIMO.name:
-            received_word_state = calculate_mimo_states(N_USER, tx.reshape(1, -1))[0]
-            rx = rx[0]
+            tx_length = N_USER
         else:
             raise ValueError("No such channel type!!!")
-        # choose the new cluster / class randomly
-        random_ind = randint(a=1, b=len(self.degrees) - 1)
-        new_tx = tx[0]
         tx_map = TX_MAPPING_DICT[conf.modulation_type]
         rx_map = RX_MAPPING_DICT[conf.modulation_type]
-        rx_transformation = torch.ones(rx.shape).to(DEVICE)
-        # apply the transformations to get the new transformed tx and rx
-        for i in range(random_ind):
-            rx_transformation *= torch.tensor([rx_map[x.item()] for x in new_tx])[:rx.shape[0]].reshape(
-                rx.shape).to(DEVICE)
-            new_tx = torch.tensor([tx_map[x.item()] for x in new_tx]).to(DEVICE)
+        tx_lut = torch.tensor([tx_map[symbol] for symbol in range(len(tx_map))]).to(DEVICE)
+        rx_lut = torch.tensor([rx_map[symbol] for symbol in range(len(rx_map))]).float().to(DEVICE)
+        source_states = torch.arange(self._centers.shape[0]).to(DEVICE)
+        new_tx = calculate_symbols_from_states(tx_length, source_states).long()
+        rx_transformation = torch.ones(self._centers.shape).to(DEVICE)
+        target_txs, rx_transformations = [new_tx], [rx_transformation]
+        # apply the transformations one after the other, to get the new transformed tx and rx for each shift
+        for _ in range(1, len(self.degrees)):
+            rx_transformation = rx_transformation * rx_lut[new_tx][:, :self._centers.shape[1]].reshape(
+                rx_transformation.shape)
+            new_tx = tx_lut[new_tx]
+            target_txs.append(new_tx), rx_transformations.append(rx_transformation)
+        self._target_txs = torch.stack(target_txs, dim=1)
+        self._target_states = torch.stack([self._calculate_states(target_tx) for target_tx in target_txs], dim=1)
+        self._rx_transformations = torch.stack(rx_transformations, dim=1)
+        self._deltas = self._centers[self._target_states] - self._rx_transformations * self._centers.unsqueeze(1)
+
+    def augment(self, rx: torch.Tensor, tx: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Translates each received word to the cluster of a randomly chosen new class
+        :param rx: received words, [batch_size, ...]. The real view for QPSK.
+        :param tx: transmitted words, [batch_size, tx_length]
+        :return: the augmented (rx,tx) pairs
+        """
+        received_word_states = self._calculate_states(tx)
+        # choose the new cluster / class randomly
+        random_inds = torch.randint(1, len(self.degrees), [rx.shape[0]]).to(DEVICE)
+        # apply the transformation to rx to get the new transformed rx, check out the paper for more details
+        new_rx = self._rx_transformations[received_word_states, random_inds] * rx + \
+                 self._deltas[received_word_states, random_inds]
+        new_tx = self._target_txs[received_word_states, random_inds].to(tx.dtype)
+        return new_rx, new_tx
+
+    @staticmethod
+    def _calculate_states(tx: torch.Tensor) -> torch.Tensor:
         if conf.channel_type == ChannelModes.SISO.name:
-            new_state = calculate_siso_states(MEMORY_LENGTH, new_tx)[0]
+            return calculate_siso_states(MEMORY_LENGTH, tx)
         elif conf.channel_type == ChannelModes.MIMO.name:
-            new_state = calculate_mimo_states(N_USER, new_tx.reshape(1, -1))[0]
+            return calculate_mimo_states(N_USER, tx)
         else:
             raise ValueError("No such channel type!!!")
-        # apply the transformation to rx to get the new transformed rx, check out the paper for more details
-        transformed_received = rx_transformation * rx
-        delta = self._centers[new_state.item()] - rx_transformation * self._centers[received_word_state.item()]
-        new_rx = delta + transformed_received
-        new_tx = new_tx.unsqueeze(0)
-        if conf.channel_type == ChannelModes.MIMO.name:
-            new_rx = new_rx.unsqueeze(0)
-        return new_rx, new_tx
 
     @property
     def centers(self) -> torch.Tensor:
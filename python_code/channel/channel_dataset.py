@@ -1,20 +1,26 @@
 import concurrent.futures
-from typing import Tuple, List
+import queue
+import threading
+from typing import Tuple, List, Iterator, Union
 
 import numpy as np
 import torch
+from numpy.random import SeedSequence, default_rng
 from torch.utils.data import Dataset
 
 from python_code import DEVICE
+from python_code.channel.dataset_cache import get_cache_key, load_cached_data, save_cached_data
 from python_code.channel.mimo_channels.mimo_channel_dataset import MIMOChannel
+from python_code.channel.mimo_channels.torch_mimo_channel import TorchMIMOChannel
 from python_code.channel.siso_channels.siso_channel_dataset import SISOChannel
+from python_code.channel.siso_channels.torch_siso_channel import TorchSISOChannel
 from python_code.utils.config_singleton import Config
-from python_code.utils.constants import ChannelModes, ModulationType
-from python_code.utils.python_utils import normalize_for_modulation
+from python_code.utils.constants import ChannelModes, ChannelBackends
 
 conf = Config()
 
 DATA_GENERATION_SIZE = 1000
+PUT_TIMEOUT = 0.1  # seconds between the checks of the streaming producer for a consumer that stopped
 
 
 class ChannelModelDataset(Dataset):
@@ -26,38 +32,130 @@ class ChannelModelDataset(Dataset):
     def __init__(self, block_length: int, pilots_length: int, blocks_num: int):
         self.blocks_num = blocks_num
         self.block_length = block_length
+        self.pilots_length = pilots_length
+        if conf.channel_type not in [ChannelModes.SISO.name, ChannelModes.MIMO.name]:
+            raise ValueError("No such channel value!")
+        if conf.channel_backend not in [ChannelBackends.numpy.name, ChannelBackends.torch.name]:
+            raise ValueError("No such channel backend!")
+
+    def _create_channel(self, snr: float) -> Union[SISOChannel, MIMOChannel, TorchSISOChannel, TorchMIMOChannel]:
+        """
+        Creates the channel of a given snr, with its own bits and noise generators derived from the seed and the snr.
+        This way the data of each snr is independent of the other snrs, and of the order they are generated in.
+        """
+        snr_bits = int(np.float64(snr).view(np.uint64))
+        bits_seed, noise_seed = SeedSequence([conf.seed, snr_bits]).spawn(2)
+        if conf.channel_backend == ChannelBackends.torch.name:
+            return self._create_torch_channel(bits_seed, noise_seed)
+        if conf.channel_type == ChannelModes.SISO.name:
+            return SISOChannel(self.block_length, self.pilots_length, default_rng(bits_seed), default_rng(noise_seed))
+        elif conf.channel_type == ChannelModes.MIMO.name:
+            return MIMOChannel(self.block_length, self.pilots_length, default_rng(bits_seed), default_rng(noise_seed))
+        else:
+            raise ValueError("No such channel value!")
+
+    def _create_torch_channel(self, bits_seed: SeedSequence, noise_seed: SeedSequence) -> Union[
+        TorchSISOChannel, TorchMIMOChannel]:
+        bits_generator = torch.Generator(device=DEVICE).manual_seed(int(bits_seed.generate_state(1)[0]))
+        noise_generator = torch.Generator(device=DEVICE).manual_seed(int(noise_seed.generate_state(1)[0]))
         if conf.channel_type == ChannelModes.SISO.name:
-            self.channel_type = SISOChannel(block_length, pilots_length)
+            return TorchSISOChannel(self.block_length, self.pilots_length, bits_generator, noise_generator)
         elif conf.channel_type == ChannelModes.MIMO.name:
-            self.channel_type = MIMOChannel(block_length, pilots_length)
+            return TorchMIMOChannel(self.block_length, self.pilots_length, bits_generator, noise_generator)
         else:
             raise ValueError("No such channel value!")
 
-    def get_snr_data(self, snr: float, database: list):
-        if database is None:
-            database = []
-        tx_full = np.empty((self.blocks_num, normalize_for_modulation(self.block_length), self.channel_type.tx_length))
-        h_full = np.empty((self.blocks_num, *self.channel_type.h_shape))
-        rx_full = np.empty((self.blocks_num, normalize_for_modulation(self.block_length), self.channel_type.rx_length),
-                           dtype=complex if conf.modulation_type == ModulationType.QPSK.name else float)
-        # accumulate words until reaches desired number
-        for index in range(self.blocks_num):
-            tx, h, rx = self.channel_type.get_vectors(snr, index)
-            # accumulate
-            tx_full[index] = tx
-            rx_full[index] = rx
-            h_full[index] = h
-
-        database.append((tx_full, rx_full, h_full))
+    def get_snr_data(self, snr: float) -> Tuple[Union[np.ndarray, torch.Tensor], ...]:
+        # the torch backend generates on the device directly, faster than reloading the blocks from the disk
+        if conf.channel_backend == ChannelBackends.torch.name:
+            tx_full, h_full, rx_full = self._create_channel(snr).get_vectors(snr, np.arange(self.blocks_num))
+            return tx_full, rx_full, h_full
+        if conf.cache_datasets:
+            cache_key = get_cache_key(snr, self.block_length, self.pilots_length, self.blocks_num)
+            cached_data = load_cached_data(cache_key)
+            if cached_data is not None:
+                return cached_data
+        # generate all the blocks at once
+        tx_full, h_full, rx_full = self._create_channel(snr).get_vectors(snr, np.arange(self.blocks_num))
+        tx_full = tx_full.astype(float)
+
+        if conf.cache_datasets:
+            save_cached_data(cache_key, tx_full, rx_full, h_full)
+        return tx_full, rx_full, h_full
 
     def __getitem__(self, snr_list: List[float]) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
-        database = []
-        # do not change max_workers
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            [executor.submit(self.get_snr_data, snr, database) for snr in snr_list]
-        tx, rx, h = (np.concatenate(arrays) for arrays in zip(*database))
-        tx, rx, h = torch.Tensor(tx).to(device=DEVICE), torch.from_numpy(rx).to(device=DEVICE), torch.Tensor(
-            h).to(device=DEVICE)
+        # each snr has its own generators, so the snrs are generated in parallel and the results do not depend on the
+        # number of workers. map returns them in the order of snr_list
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(conf.data_workers, 1)) as executor:
+            database = list(executor.map(self.get_snr_data, snr_list))
+        if conf.channel_backend == ChannelBackends.torch.name:
+            tx, rx, h = (torch.cat(tensors) for tensors in zip(*database))
+        else:
+            tx, rx, h = (np.concatenate(arrays) for arrays in zip(*database))
+        return self._to_tensors(tx, rx, h)
+
+    def iterate_blocks(self, snr: float, prefetch_blocks: int = 1) -> Iterator[
+        Tuple[torch.Tensor, torch.Tensor, torch.Tensor]]:
+        """
+        Streaming mode - yields the (tx, rx, h) of each block only when it is asked for, instead of materializing all
+        of them upfront. A background thread generates up to prefetch_blocks blocks ahead, so memory is bounded by
+        the prefetch depth and not by the number of blocks. The blocks are generated in order from the same generators,
+        so they are identical to the ones returned by __getitem__.
+        :param snr: signal-to-noise value
+        :param prefetch_blocks: number of blocks generated ahead of the consumer
+        """
+        cached_data = None
+        if conf.cache_datasets and conf.channel_backend == ChannelBackends.numpy.name:
+            cached_data = load_cached_data(get_cache_key(snr, self.block_length, self.pilots_length, self.blocks_num))
+        channel = self._create_channel(snr)
+        blocks_queue = queue.Queue(maxsize=max(prefetch_blocks, 1))
+        # set once the consumer is done, also when it stopped before the last block, to release the producer
+        stop_event = threading.Event()
+
+        def put_block(item: Union[Tuple[torch.Tensor, torch.Tensor, torch.Tensor], Exception]) -> bool:
+            """
+            Waits for room in the queue, unless the consumer is done
+            :return: whether the item was put
+            """
+            while not stop_event.is_set():
+                try:
+                    blocks_queue.put(item, timeout=PUT_TIMEOUT)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def generate_blocks():
+            try:
+                for index in range(self.blocks_num):
+                    if cached_data is not None:
+                        tx, rx, h = (array[index] for array in cached_data)
+                    else:
+                        tx, h, rx = (array[0] for array in channel.get_vectors(snr, np.array([index])))
+                    if not put_block(self._to_tensors(tx, rx, h)):
+                        return
+            except Exception as e:
+                put_block(e)
+
+        producer = threading.Thread(target=generate_blocks, daemon=True)
+        producer.start()
+        try:
+            for _ in range(self.blocks_num):
+                block = blocks_queue.get()
+                if isinstance(block, Exception):
+                    raise block
+                yield block
+        finally:
+            stop_event.set()
+            producer.join()
+
+    @staticmethod
+    def _to_tensors(tx: Union[np.ndarray, torch.Tensor], rx: Union[np.ndarray, torch.Tensor],
+                    h: Union[np.ndarray, torch.Tensor]) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        if isinstance(rx, torch.Tensor):
+            return tx.float(), rx, h
+        tx, rx, h = torch.Tensor(tx).to(device=DEVICE), torch.from_numpy(np.ascontiguousarray(rx)).to(
+            device=DEVICE), torch.Tensor(h).to(device=DEVICE)
         return tx, rx, h
 
     def __len__(self):
@@ -0,0 +1,112 @@
+import glob
+import os
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+import scipy.io
+
+from dir_definitions import SISO_COST2100_DIR, MIMO_COST2100_DIR, COST2100_BANKS_DIR
+
+BANK_FILE_NAME = 'h_bank.npy'
+MAX_FRAMES = 25
+
+
+def get_bank_path(source_dir: str, banks_dir: str = COST2100_BANKS_DIR) -> str:
+    """
+    The path of the bank of the given .mat files folder, under the results - the banks are generated files
+    """
+    return os.path.join(banks_dir, f'{os.path.basename(os.path.normpath(source_dir)).lower()}_{BANK_FILE_NAME}')
+
+
+def convert_siso_bank(siso_dir: str = SISO_COST2100_DIR, banks_dir: str = COST2100_BANKS_DIR) -> str:
+    """
+    Converts the SISO taps files h_0.mat, h_1.mat, ... into a single [n_taps, trajectory_length] array file
+    :param siso_dir: the folder of the taps files
+    :param banks_dir: the folder of the array file
+    :return: the path of the array file
+    """
+    taps = []
+    while os.path.isfile(os.path.join(siso_dir, f'h_{len(taps)}.mat')):
+        h_channel_response = scipy.io.loadmat(os.path.join(siso_dir, f'h_{len(taps)}.mat'))
+        taps.append(h_channel_response['h_channel_response_mag'].reshape(-1))
+    if len(taps) == 0:
+        raise ValueError(f"No COST2100 taps files were found in {siso_dir}!")
+    bank_path = get_bank_path(siso_dir, banks_dir)
+    os.makedirs(banks_dir, exist_ok=True)
+    np.save(bank_path, np.stack(taps).astype(float))
+    return bank_path
+
+
+def convert_mimo_bank(mimo_dir: str = MIMO_COST2100_DIR, banks_dir: str = COST2100_BANKS_DIR) -> str:
+    """
+    Converts the MIMO users files <folder>/h_<user>.mat, with folders 1, 2, ... of MAX_FRAMES frames each, into a single
+    [n_folders * MAX_FRAMES, n_user, n_ant] array file. The row of frame index i is simply i.
+    :param mimo_dir: the folder of the users files
+    :param banks_dir: the folder of the array file
+    :return: the path of the array file
+    """
+    folders = []
+    while os.path.isdir(os.path.join(mimo_dir, f'{len(folders) + 1}')):
+        folder_path = os.path.join(mimo_dir, f'{len(folders) + 1}')
+        users = []
+        while os.path.isfile(os.path.join(folder_path, f'h_{len(users) + 1}.mat')):
+            path_to_mat = os.path.join(folder_path, f'h_{len(users) + 1}.mat')
+            user_frames = scipy.io.loadmat(path_to_mat)['norm_channel']
+            if user_frames.shape[0] != MAX_FRAMES:
+                # a shorter folder would shift the frame indices of all the later folders
+                raise ValueError(f"{path_to_mat} has {user_frames.shape[0]} frames instead of {MAX_FRAMES}!")
+            users.append(user_frames)
+        folders.append(np.stack(users, axis=1))
+    if len(folders) == 0:
+        raise ValueError(f"No COST2100 frames folders were found in {mimo_dir}!")
+    bank_path = get_bank_path(mimo_dir, banks_dir)
+    os.makedirs(banks_dir, exist_ok=True)
+    np.save(bank_path, np.concatenate(folders).astype(float))
+    return bank_path
+
+
+def is_bank_stale(bank_path: str, source_paths: List[str]) -> bool:
+    """
+    Whether the bank is missing, or older than any of its source files
+    """
+    if not os.path.isfile(bank_path):
+        return True
+    bank_time = os.path.getmtime(bank_path)
+    return any(os.path.getmtime(source_path) > bank_time for source_path in source_paths)
+
+
+@lru_cache()
+def memory_map_bank(bank_path: str, bank_time: float) -> np.ndarray:
+    """
+    Memory-maps the bank. The modification time is part of the cache key, so a rebuilt bank is mapped anew.
+    """
+    return np.load(bank_path, mmap_mode='r')
+
+
+def load_siso_bank(siso_dir: str = SISO_COST2100_DIR, banks_dir: str = COST2100_BANKS_DIR) -> np.ndarray:
+    """
+    Memory-maps the SISO bank, converting the taps files if the bank is missing or older than them
+    :return: [n_taps, trajectory_length] array
+    """
+    bank_path = get_bank_path(siso_dir, banks_dir)
+    if is_bank_stale(bank_path, glob.glob(os.path.join(siso_dir, 'h_*.mat'))):
+        convert_siso_bank(siso_dir, banks_dir)
+    return memory_map_bank(bank_path, os.path.getmtime(bank_path))
+
+
+def load_mimo_bank(mimo_dir: str = MIMO_COST2100_DIR, banks_dir: str = COST2100_BANKS_DIR) -> np.ndarray:
+    """
+    Memory-maps the MIMO bank, converting the users files if the bank is missing or older than them
+    :return: [n_frames, n_user, n_ant] array
+    """
+    bank_path = get_bank_path(mimo_dir, banks_dir)
+    if is_bank_stale(bank_path, glob.glob(os.path.join(mimo_dir, '*', 'h_*.mat'))):
+        convert_mimo_bank(mimo_dir, banks_dir)
+    return memory_map_bank(bank_path, os.path.getmtime(bank_path))
+
+
+if __name__ == '__main__':
+    # the banks are also rebuilt automatically once the .mat files are newer than them
+    print(convert_siso_bank())
+    print(convert_mimo_bank())
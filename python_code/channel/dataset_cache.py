@@ -0,0 +1,66 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import Optional, Tuple
+
+import numpy as np
+
+from dir_definitions import DATASETS_DIR
+from python_code.channel.channels_hyperparams import MEMORY_LENGTH, N_USER, N_ANT
+from python_code.utils.config_singleton import Config
+
+conf = Config()
+
+# bump whenever the generated data changes for the same settings, to invalidate the saved datasets
+DATASET_CACHE_VERSION = 4
+ARRAYS_NAMES = ['tx', 'rx', 'h']
+
+
+def get_cache_key(snr: float, block_length: int, pilots_length: int, blocks_num: int) -> str:
+    """
+    Hashes all the settings that determine the generated channel blocks into a key
+    """
+    settings = {'version': DATASET_CACHE_VERSION,
+                'channel_type': conf.channel_type,
+                'channel_model': conf.channel_model,
+                'snr': snr,
+                'seed': conf.seed,
+                'block_length': block_length,
+                'pilots_length': pilots_length,
+                'blocks_num': blocks_num,
+                'fading_in_channel': conf.fading_in_channel,
+                'linear': conf.linear,
+                'modulation_type': conf.modulation_type,
+                'n_user': N_USER,
+                'n_ant': N_ANT,
+                'memory_length': MEMORY_LENGTH}
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+
+def load_cached_data(key: str) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Loads the saved (tx, rx, h) arrays of the given key as memory-mapped arrays, or None if they were never saved
+    """
+    cache_path = os.path.join(DATASETS_DIR, key)
+    if not os.path.isdir(cache_path):
+        return None
+    # copy-on-write mapping - the arrays are read lazily from disk and writes never reach the file
+    return tuple(np.load(os.path.join(cache_path, f'{name}.npy'), mmap_mode='c') for name in ARRAYS_NAMES)
+
+
+def save_cached_data(key: str, tx: np.ndarray, rx: np.ndarray, h: np.ndarray):
+    """
+    Saves the (tx, rx, h) arrays of the given key as raw arrays. Written to a temporary folder first, so an
+    interrupted save never leaves a partial dataset behind.
+    """
+    cache_path = os.path.join(DATASETS_DIR, key)
+    temp_path = f'{cache_path}.{os.getpid()}.tmp'
+    os.makedirs(temp_path, exist_ok=True)
+    for name, array in zip(ARRAYS_NAMES, [tx, rx, h]):
+        np.save(os.path.join(temp_path, f'{name}.npy'), array)
+    try:
+        os.rename(temp_path, cache_path)
+    except OSError:
+        # already saved by a concurrent run
+        shutil.rmtree(temp_path, ignore_errors=True)
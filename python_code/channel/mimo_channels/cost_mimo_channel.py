@@ -1,43 +1,42 @@
-import os
-
 import numpy as np
-import scipy.io
 
-from dir_definitions import MIMO_COST2100_DIR
 from python_code.channel.channels_hyperparams import N_ANT, N_USER
+from python_code.channel.cost2100_bank import load_mimo_bank
 from python_code.utils.config_singleton import Config
 
 conf = Config()
 
 SCALING_COEF = 0.5
-MAX_FRAMES = 25
 
 
 class Cost2100MIMOChannel:
     @staticmethod
     def calculate_channel(n_ant: int, n_user: int, frame_ind: int, fading: bool) -> np.ndarray:
-        total_h = np.empty([n_user, n_ant])
-        main_folder = 1 + (frame_ind // MAX_FRAMES)
-        for i in range(1, n_user + 1):
-            path_to_mat = os.path.join(MIMO_COST2100_DIR, f'{main_folder}', f'h_{i}.mat')
-            h_user = scipy.io.loadmat(path_to_mat)['norm_channel'][frame_ind % MAX_FRAMES, :N_USER]
-            total_h[i - 1] = SCALING_COEF * h_user
-
-        total_h[np.arange(n_user), np.arange(n_user)] = 1
+        return Cost2100MIMOChannel.calculate_channels(n_ant, n_user, np.array([frame_ind]), fading)[0]
+
+    @staticmethod
+    def calculate_channels(n_ant: int, n_user: int, frame_inds: np.ndarray, fading: bool) -> np.ndarray:
+        """
+        Calculates the channel of all the given frame indices at once, sliced from the memory-mapped users bank
+        :return: channel matrices, [len(frame_inds), n_user, n_ant]
+        """
+        total_h = SCALING_COEF * load_mimo_bank()[frame_inds, :n_user, :N_USER]
+        total_h[:, np.arange(n_user), np.arange(n_user)] = 1
         return total_h
 
     @staticmethod
-    def transmit(s: np.ndarray, h: np.ndarray, snr: float) -> np.ndarray:
+    def transmit(s: np.ndarray, h: np.ndarray, snr: float, noise_generator: np.random.Generator) -> np.ndarray:
         """
         The MIMO COST2100 Channel
-        :param s: to transmit symbol words
+        :param s: to transmit symbol words, [..., n_user, transmission_length]
         :param snr: signal-to-noise value
-        :param h: channel coefficients
+        :param h: channel coefficients, [..., n_ant, n_user]
+        :param noise_generator: generator of the noise
         :return: received word
         """
         conv = Cost2100MIMOChannel._compute_channel_signal_convolution(h, s)
         sigma = 10 ** (-0.1 * snr)
-        w = np.sqrt(sigma) * np.random.randn(N_ANT, s.shape[1])
+        w = np.sqrt(sigma) * noise_generator.standard_normal((*s.shape[:-2], N_ANT, s.shape[-1]))
         y = conv + w
         return y
 
@@ -1,7 +1,6 @@
 from typing import Tuple
 
 import numpy as np
-from numpy.random import default_rng
 
 from python_code.channel.channels_hyperparams import N_ANT, N_USER, MODULATION_NUM_MAPPING
 from python_code.channel.mimo_channels.cost_mimo_channel import Cost2100MIMOChannel
@@ -9,7 +8,9 @@ from python_code.channel.mimo_channels.sed_channel import SEDChannel
 from python_code.channel.modulator import MODULATION_DICT
 from python_code.utils.config_singleton import Config
 from python_code.utils.constants import ChannelModels, ModulationType
-from python_code.utils.trellis_utils import get_qpsk_symbols_from_bits, generate_bits_by_state
+from python_code.utils.pilots_utils import get_mimo_states_symbols
+from python_code.utils.python_utils import normalize_for_modulation
+from python_code.utils.trellis_utils import get_qpsk_symbols_from_bits
 
 conf = Config()
 
@@ -18,36 +19,38 @@ MIMO_CHANNELS_DICT = {ChannelModels.Synthetic.name: SEDChannel,
 
 
 class MIMOChannel:
-    def __init__(self, block_length: int, pilots_length: int):
+    def __init__(self, block_length: int, pilots_length: int, bits_generator: np.random.Generator,
+                 noise_generator: np.random.Generator):
         self._block_length = block_length
         self._pilots_length = pilots_length
-        self._bits_generator = default_rng(seed=conf.seed)
+        self._bits_generator = bits_generator
+        self._noise_generator = noise_generator
         self.tx_length = N_USER
         self.h_shape = [N_ANT, N_USER]
         self.rx_length = N_ANT
 
     def _transmit(self, h: np.ndarray, snr: float) -> Tuple[np.ndarray, np.ndarray]:
-        tx_pilots = self._generate_all_classes_pilots()
-        tx_data = self._bits_generator.integers(0, 2, size=(self._block_length - self._pilots_length, N_USER))
-        tx = np.concatenate([tx_pilots, tx_data])
+        # create pilots and data, block after block
+        tx = np.stack([self._generate_block_bits() for _ in range(h.shape[0])])
         # modulation
-        s = MODULATION_DICT[conf.modulation_type].modulate(tx.T)
-        # pass through channel
-        rx = MIMO_CHANNELS_DICT[conf.channel_model].transmit(s=s, h=h, snr=snr)
+        s = MODULATION_DICT[conf.modulation_type].modulate(np.swapaxes(tx, 1, 2))
+        # pass through channel, all blocks at once
+        rx = MIMO_CHANNELS_DICT[conf.channel_model].transmit(s=s, h=h, snr=snr, noise_generator=self._noise_generator)
         if conf.modulation_type == ModulationType.QPSK.name:
             tx = get_qpsk_symbols_from_bits(tx)
-        return tx, rx.T
+        return tx, np.swapaxes(rx, 1, 2)
 
-    def _generate_all_classes_pilots(self):
-        # generate random pilots block of bits
-        tx_pilots = self._bits_generator.integers(0, 2, size=(self._pilots_length, N_USER))
-        if conf.modulation_type == ModulationType.QPSK.name:
-            tx_pilots = get_qpsk_symbols_from_bits(tx_pilots)
+    def _generate_block_bits(self) -> np.ndarray:
+        tx_pilots = self._generate_all_classes_pilots()
+        tx_data = self._bits_generator.integers(0, 2, size=(self._block_length - self._pilots_length, N_USER))
+        return np.concatenate([tx_pilots, tx_data])
 
-        # ensure that you have each state
-        unique_states_num = MODULATION_NUM_MAPPING[conf.modulation_type] ** N_USER
-        for unique_state in range(min(unique_states_num, tx_pilots.shape[0])):
-            tx_pilots[unique_state] = generate_bits_by_state(unique_state, N_USER).cpu().numpy().reshape(-1)
+    def _generate_all_classes_pilots(self):
+        # ensure that you have each state, followed by a random pilots block of symbols
+        states_symbols = get_mimo_states_symbols(N_USER, self._pilots_length).cpu().numpy()
+        random_symbols = self._bits_generator.integers(0, MODULATION_NUM_MAPPING[conf.modulation_type], size=(
+            normalize_for_modulation(self._pilots_length) - states_symbols.shape[0], N_USER))
+        tx_pilots = np.concatenate([states_symbols, random_symbols])
 
         if conf.modulation_type == ModulationType.QPSK.name:
             first_bit = tx_pilots % 2
@@ -57,12 +60,16 @@ class MIMOChannel:
             tx_pilots = transposed_array.reshape(2 * first_bit.shape[0], -1)
         return tx_pilots
 
-    def get_vectors(self, snr: float, index: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    def get_vectors(self, snr: float, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Generates the blocks of the given indices at once
+        :return: tx [blocks, block_length, n_user], h [blocks, n_ant, n_user], rx [blocks, block_length, n_ant]
+        """
         # get channel values
         if conf.channel_model == ChannelModels.Synthetic.name:
-            h = SEDChannel.calculate_channel(N_ANT, N_USER, index, conf.fading_in_channel)
+            h = SEDChannel.calculate_channels(N_ANT, N_USER, indices, conf.fading_in_channel)
         elif conf.channel_model == ChannelModels.Cost2100.name:
-            h = Cost2100MIMOChannel.calculate_channel(N_ANT, N_USER, index, conf.fading_in_channel)
+            h = Cost2100MIMOChannel.calculate_channels(N_ANT, N_USER, indices, conf.fading_in_channel)
         else:
             raise ValueError("No such channel model!!!")
         tx, rx = self._transmit(h, snr)
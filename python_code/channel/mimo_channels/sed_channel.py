@@ -9,36 +9,46 @@ conf = Config()
 class SEDChannel:
     @staticmethod
     def calculate_channel(n_ant: int, n_user: int, frame_ind: int, fading: bool) -> np.ndarray:
+        return SEDChannel.calculate_channels(n_ant, n_user, np.array([frame_ind]), fading)[0]
+
+    @staticmethod
+    def calculate_channels(n_ant: int, n_user: int, frame_inds: np.ndarray, fading: bool) -> np.ndarray:
+        """
+        Calculates the channel of all the given frame indices at once
+        :return: channel matrices, [len(frame_inds), n_ant, n_user]
+        """
         H_row = np.array([i for i in range(n_ant)])
         H_row = np.tile(H_row, [n_user, 1]).T
         H_column = np.array([i for i in range(n_user)])
         H_column = np.tile(H_column, [n_ant, 1])
         H = np.exp(-np.abs(H_row - H_column))
+        H = np.tile(H, [len(frame_inds), 1, 1])
         if fading:
-            H = SEDChannel._add_fading(H, n_ant, frame_ind)
+            H = SEDChannel._add_fading(H, n_ant, frame_inds)
         return H
 
     @staticmethod
-    def _add_fading(H: np.ndarray, n_ant: int, frame_ind: int) -> np.ndarray:
+    def _add_fading(H: np.ndarray, n_ant: int, frame_inds: np.ndarray) -> np.ndarray:
         degs_array = np.array([51, 39, 33, 21])
         center = 0.8
-        fade_mat = center + (1 - center) * np.cos(2 * np.pi * frame_ind / degs_array)
-        fade_mat = np.tile(fade_mat.reshape(1, -1), [n_ant, 1])
+        fade_mat = center + (1 - center) * np.cos(2 * np.pi * frame_inds.reshape(-1, 1) / degs_array)
+        fade_mat = np.tile(fade_mat.reshape(-1, 1, degs_array.shape[0]), [1, n_ant, 1])
         return H * fade_mat
 
     @staticmethod
-    def transmit(s: np.ndarray, h: np.ndarray, snr: float) -> np.ndarray:
+    def transmit(s: np.ndarray, h: np.ndarray, snr: float, noise_generator: np.random.Generator) -> np.ndarray:
         """
         The MIMO SED Channel
-        :param s: to transmit symbol words
+        :param s: to transmit symbol words, [..., n_user, transmission_length]
         :param snr: signal-to-noise value
-        :param h: channel function
+        :param h: channel function, [..., n_ant, n_user]
+        :param noise_generator: generator of the noise
         :return: received word
         """
 
         conv = SEDChannel._compute_channel_signal_convolution(h, s)
         sigma = 10 ** (-0.1 * snr)
-        w = np.sqrt(sigma) * np.random.randn(N_ANT, s.shape[1])
+        w = np.sqrt(sigma) * noise_generator.standard_normal((*s.shape[:-2], N_ANT, s.shape[-1]))
         y = conv + w
         if not conf.linear:
             y = np.tanh(y)
@@ -0,0 +1,70 @@
+from typing import Tuple
+
+import numpy as np
+import torch
+
+from python_code import DEVICE
+from python_code.channel.channels_hyperparams import N_ANT, N_USER, MODULATION_NUM_MAPPING
+from python_code.channel.mimo_channels.mimo_channel_dataset import MIMO_CHANNELS_DICT
+from python_code.channel.modulator import MODULATION_DICT
+from python_code.utils.config_singleton import Config
+from python_code.utils.constants import ChannelModels
+from python_code.utils.pilots_utils import get_mimo_states_symbols
+from python_code.utils.python_utils import normalize_for_modulation
+
+conf = Config()
+
+
+class TorchMIMOChannel:
+    """
+    Torch version of MIMOChannel. Generates the blocks directly on the device in float32/complex64, with torch
+    generators. The symbols are drawn directly, instead of drawing their bits.
+    """
+
+    def __init__(self, block_length: int, pilots_length: int, bits_generator: torch.Generator,
+                 noise_generator: torch.Generator):
+        self._block_length = block_length
+        self._pilots_length = pilots_length
+        self._bits_generator = bits_generator
+        self._noise_generator = noise_generator
+
+    def _transmit(self, h: torch.Tensor, snr: float) -> Tuple[torch.Tensor, torch.Tensor]:
+        # create pilots and data, block after block
+        tx = torch.stack([self._generate_block_symbols() for _ in range(h.shape[0])])
+        # modulation
+        s = MODULATION_DICT[conf.modulation_type].modulate_symbols(tx).transpose(1, 2)
+        # pass through channel, all blocks at once
+        conv = torch.matmul(h.to(s.dtype), s)
+        sigma = 10 ** (-0.1 * snr)
+        # the noise is drawn block after block, as when the blocks are generated one at a time
+        w = np.sqrt(sigma) * torch.stack(
+            [torch.randn(conv.shape[1:], generator=self._noise_generator, device=DEVICE) for _ in range(conv.shape[0])])
+        rx = conv + w
+        if conf.channel_model == ChannelModels.Synthetic.name and not conf.linear:
+            rx = torch.tanh(rx)
+        return tx.float(), rx.transpose(1, 2)
+
+    def _generate_block_symbols(self) -> torch.Tensor:
+        tx_pilots = self._generate_all_classes_pilots()
+        tx_data = torch.randint(0, MODULATION_NUM_MAPPING[conf.modulation_type],
+                                [normalize_for_modulation(self._block_length - self._pilots_length), N_USER],
+                                generator=self._bits_generator, device=DEVICE)
+        return torch.cat([tx_pilots, tx_data])
+
+    def _generate_all_classes_pilots(self) -> torch.Tensor:
+        # ensure that you have each state, followed by a random pilots block of symbols
+        states_symbols = get_mimo_states_symbols(N_USER, self._pilots_length)
+        random_symbols = torch.randint(0, MODULATION_NUM_MAPPING[conf.modulation_type],
+                                       [normalize_for_modulation(self._pilots_length) - states_symbols.shape[0],
+                                        N_USER], generator=self._bits_generator, device=DEVICE)
+        return torch.cat([states_symbols, random_symbols])
+
+    def get_vectors(self, snr: float, indices: np.ndarray) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """
+        Generates the blocks of the given indices at once
+        :return: tx [blocks, block_length, n_user], h [blocks, n_ant, n_user], rx [blocks, block_length, n_ant]
+        """
+        h = MIMO_CHANNELS_DICT[conf.channel_model].calculate_channels(N_ANT, N_USER, indices, conf.fading_in_channel)
+        h = torch.tensor(h, dtype=torch.float32, device=DEVICE)
+        tx, rx = self._transmit(h, snr)
+        return tx, h, rx
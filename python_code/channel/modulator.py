@@ -3,6 +3,10 @@ import torch
 
 from python_code.utils.constants import HALF
 
+# the constellation points by the symbol index, used by the lookup-table modulation of the torch backend
+BPSK_CONSTELLATION = torch.tensor([1, -1], dtype=torch.float32)
+QPSK_CONSTELLATION = torch.tensor([1 + 1j, -1 + 1j, 1 - 1j, -1 - 1j], dtype=torch.complex64) / np.sqrt(2)
+
 
 class BPSKModulator:
     @staticmethod
@@ -15,6 +19,15 @@ class BPSKModulator:
         x = 1 - 2 * c
         return x
 
+    @staticmethod
+    def modulate_symbols(c: torch.Tensor) -> torch.Tensor:
+        """
+        BPSK modulation by a lookup table 0->1, 1->-1
+        :param c: the binary codeword tensor
+        :return: binary modulated signal, float32
+        """
+        return BPSK_CONSTELLATION.to(c.device)[c.long()]
+
     @staticmethod
     def demodulate(s: torch.Tensor) -> torch.Tensor:
         """
@@ -35,12 +48,21 @@ class QPSKModulator:
         [0,1] -> [1/sqrt(2),-1/sqrt(2)]
         [1,0] -> [-1/sqrt(2),1/sqrt(2)]
         [1,1] -> [-1/sqrt(2),-1/sqrt(2)]
-        :param c: the binary codeword
+        :param c: the binary codeword, bits along the last axis
         :return: modulated signal
         """
-        x = (-1) ** c[:, ::2] / np.sqrt(2) + (-1) ** c[:, 1::2] / np.sqrt(2) * 1j
+        x = (-1) ** c[..., ::2] / np.sqrt(2) + (-1) ** c[..., 1::2] / np.sqrt(2) * 1j
         return x
 
+    @staticmethod
+    def modulate_symbols(c: torch.Tensor) -> torch.Tensor:
+        """
+        QPSK modulation by a lookup table, of the symbols (2 bits each, first bit + 2 * second bit)
+        :param c: the symbols tensor, values in 0,...,3
+        :return: modulated signal, complex64
+        """
+        return QPSK_CONSTELLATION.to(c.device)[c.long()]
+
     @staticmethod
     def demodulate(s: torch.Tensor) -> torch.Tensor:
         return ((-1) * HALF * (torch.view_as_real(s) - 1)).transpose(1, 2).reshape(-1, s.shape[1])
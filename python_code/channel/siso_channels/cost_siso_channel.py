@@ -1,13 +1,9 @@
-import os
+from typing import Tuple
 
 import numpy as np
-import scipy.io
-from numpy.random import default_rng
+from numpy.lib.stride_tricks import sliding_window_view
 
-from dir_definitions import SISO_COST2100_DIR
-from python_code.utils.config_singleton import Config
-
-conf = Config()
+from python_code.channel.cost2100_bank import load_siso_bank
 
 COST_LENGTH = 200
 COST_STEP = 2
@@ -16,39 +12,44 @@ COST_STEP = 2
 class Cost2100SISOChannel:
     @staticmethod
     def calculate_channel(memory_length: int, fading: bool = False, index: int = 0) -> np.ndarray:
-        total_h = np.empty([COST_LENGTH // COST_STEP, memory_length])
-        for i in range(memory_length):
-            h_channel_response = scipy.io.loadmat(os.path.join(SISO_COST2100_DIR, f'h_{i}'))
-            total_h[:, i] = h_channel_response['h_channel_response_mag'].reshape(-1)[:COST_LENGTH][::COST_STEP]
-        h = np.reshape(total_h[index], [1, memory_length])
+        return Cost2100SISOChannel.calculate_channels(memory_length, fading, np.array([index]))[0]
+
+    @staticmethod
+    def calculate_channels(memory_length: int, fading: bool, indices: np.ndarray) -> np.ndarray:
+        """
+        Calculates the channel of all the given block indices at once, sliced from the memory-mapped taps bank
+        :return: channel coefficients, [len(indices), 1, memory_length]
+        """
+        total_h = load_siso_bank()[:memory_length, :COST_LENGTH:COST_STEP]
+        h = np.reshape(total_h[:, indices].T, [-1, 1, memory_length])
         h *= 0.8
         return h
 
     @staticmethod
-    def transmit(s: np.ndarray, h: np.ndarray, snr: float, memory_length: int) -> np.ndarray:
+    def transmit(s: np.ndarray, h: np.ndarray, snr: float, memory_length: int,
+                 noise_generator: np.random.Generator) -> np.ndarray:
         """
         The SISO COST2100 Channel
-        :param s: to transmit symbol words
+        :param s: to transmit symbol words, [..., 1, transmission_length]
         :param snr: signal-to-noise value
-        :param h: channel coefficients
+        :param h: channel coefficients, [..., 1, memory_length]
         :param memory_length: length of channel memory
+        :param noise_generator: generator of the noise
         :return: received word
         """
         conv = Cost2100SISOChannel._compute_channel_signal_convolution(h, memory_length, s)
-        [row, col] = conv.shape
-        w = Cost2100SISOChannel._sample_noise_vector(row, col, snr)
+        w = Cost2100SISOChannel._sample_noise_vector(conv.shape, snr, noise_generator)
         y = conv + w
         return y
 
     @staticmethod
     def _compute_channel_signal_convolution(h: np.ndarray, memory_length: int, s: np.ndarray) -> np.ndarray:
-        blockwise_s = np.concatenate([s[:, i:-memory_length + i] for i in range(memory_length)], axis=0)
-        conv = np.dot(h[:, ::-1], blockwise_s)
+        blockwise_s = sliding_window_view(s, memory_length, axis=-1)[..., :-1, :]
+        conv = np.einsum('...ik,...k->...i', blockwise_s, h[..., ::-1])
         return conv
 
     @staticmethod
-    def _sample_noise_vector(row: int, col: int, snr: float) -> np.ndarray:
-        noise_generator = default_rng(seed=conf.seed)
+    def _sample_noise_vector(shape: Tuple[int, ...], snr: float, noise_generator: np.random.Generator) -> np.ndarray:
         snr_value = 10 ** (snr / 10)
-        w = (snr_value ** (-0.5)) * noise_generator.standard_normal((row, col))
+        w = (snr_value ** (-0.5)) * noise_generator.standard_normal(shape)
         return w
@@ -1,5 +1,7 @@
+from typing import Tuple
+
 import numpy as np
-from numpy.random import default_rng
+from numpy.lib.stride_tricks import sliding_window_view
 
 from python_code.utils.config_singleton import Config
 
@@ -11,32 +13,42 @@ GAMMA = 0.5  # gamma value for time decay SISO fading
 class ISIAWGNChannel:
     @staticmethod
     def calculate_channel(memory_length: int, fading: bool = False, index: int = 0) -> np.ndarray:
-        h = np.reshape(np.exp(-GAMMA * np.arange(memory_length)), [1, memory_length])
+        return ISIAWGNChannel.calculate_channels(memory_length, fading, np.array([index]))[0]
+
+    @staticmethod
+    def calculate_channels(memory_length: int, fading: bool, indices: np.ndarray) -> np.ndarray:
+        """
+        Calculates the channel of all the given block indices at once
+        :return: channel coefficients, [len(indices), 1, memory_length]
+        """
+        h = np.reshape(np.exp(-GAMMA * np.arange(memory_length)), [1, 1, memory_length])
+        h = np.tile(h, [len(indices), 1, 1])
         if fading:
-            h = ISIAWGNChannel._add_fading(h, memory_length, index)
+            h = ISIAWGNChannel._add_fading(h, memory_length, indices)
         else:
             h *= 0.8
         return h
 
     @staticmethod
-    def _add_fading(h: np.ndarray, memory_length: int, index: int) -> np.ndarray:
+    def _add_fading(h: np.ndarray, memory_length: int, indices: np.ndarray) -> np.ndarray:
         fading_taps = np.array([51, 39, 33, 21])
-        h *= (0.8 + 0.2 * np.cos(2 * np.pi * index / fading_taps)).reshape(1, memory_length)
+        h *= (0.8 + 0.2 * np.cos(2 * np.pi * indices.reshape(-1, 1) / fading_taps)).reshape(-1, 1, memory_length)
         return h
 
     @staticmethod
-    def transmit(s: np.ndarray, h: np.ndarray, snr: float, memory_length: int) -> np.ndarray:
+    def transmit(s: np.ndarray, h: np.ndarray, snr: float, memory_length: int,
+                 noise_generator: np.random.Generator) -> np.ndarray:
         """
         The SISO AWGN Channel
-        :param s: to transmit symbol words
+        :param s: to transmit symbol words, [..., 1, transmission_length]
         :param snr: signal-to-noise value
-        :param h: channel function
+        :param h: channel function, [..., 1, memory_length]
         :param memory_length: length of channel memory
+        :param noise_generator: generator of the noise
         :return: received word
         """
         conv = ISIAWGNChannel._compute_channel_signal_convolution(h, memory_length, s)
-        [row, col] = conv.shape
-        w = ISIAWGNChannel._sample_noise_vector(row, col, snr)
+        w = ISIAWGNChannel._sample_noise_vector(conv.shape, snr, noise_generator)
         y = conv + w
         if not conf.linear:
             y = np.tanh(y)
@@ -44,13 +56,12 @@ class ISIAWGNChannel:
 
     @staticmethod
     def _compute_channel_signal_convolution(h: np.ndarray, memory_length: int, s: np.ndarray) -> np.ndarray:
-        blockwise_s = np.concatenate([s[:, i:-memory_length + i] for i in range(memory_length)], axis=0)
-        conv = np.dot(h[:, ::-1], blockwise_s)
+        blockwise_s = sliding_window_view(s, memory_length, axis=-1)[..., :-1, :]
+        conv = np.einsum('...ik,...k->...i', blockwise_s, h[..., ::-1])
         return conv
 
     @staticmethod
-    def _sample_noise_vector(row: int, col: int, snr: float) -> np.ndarray:
-        noise_generator = default_rng(seed=conf.seed)
+    def _sample_noise_vector(shape: Tuple[int, ...], snr: float, noise_generator: np.random.Generator) -> np.ndarray:
         snr_value = 10 ** (snr / 10)
-        w = (snr_value ** (-0.5)) * noise_generator.standard_normal((row, col))
+        w = (snr_value ** (-0.5)) * noise_generator.standard_normal(shape)
         return w
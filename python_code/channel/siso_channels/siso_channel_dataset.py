@@ -1,18 +1,15 @@
 from typing import Tuple
 
 import numpy as np
-import torch
-from numpy.random import default_rng
+from numpy.lib.stride_tricks import sliding_window_view
 
-from python_code import DEVICE
-from python_code.channel.channels_hyperparams import MEMORY_LENGTH, MODULATION_NUM_MAPPING
+from python_code.channel.channels_hyperparams import MEMORY_LENGTH
 from python_code.channel.modulator import MODULATION_DICT
 from python_code.channel.siso_channels.cost_siso_channel import Cost2100SISOChannel
 from python_code.channel.siso_channels.isi_awgn_channel import ISIAWGNChannel
 from python_code.utils.config_singleton import Config
 from python_code.utils.constants import ChannelModels, ModulationType
-from python_code.utils.trellis_utils import calculate_siso_states, \
-    break_transmitted_siso_word_to_symbols
+from python_code.utils.pilots_utils import get_siso_states_sequence
 
 conf = Config()
 
@@ -21,49 +18,57 @@ SISO_CHANNELS_DICT = {ChannelModels.Synthetic.name: ISIAWGNChannel,
 
 
 class SISOChannel:
-    def __init__(self, block_length: int, pilots_length: int):
+    def __init__(self, block_length: int, pilots_length: int, bits_generator: np.random.Generator,
+                 noise_generator: np.random.Generator):
         self._block_length = block_length
         self._pilots_length = pilots_length
-        self._bits_generator = default_rng(seed=conf.seed)
+        self._bits_generator = bits_generator
+        self._noise_generator = noise_generator
         self.tx_length = MEMORY_LENGTH
         self.h_shape = [1, MEMORY_LENGTH]
         self.rx_length = 1
 
     def _transmit(self, h: np.ndarray, snr: float) -> Tuple[np.ndarray, np.ndarray]:
-        # create pilots and data
-        b_pilots = self._generate_all_classes_pilots()
-        b_data = self._bits_generator.integers(0, 2, size=(1, self._block_length - self._pilots_length))
-        b = np.concatenate([b_pilots, b_data], axis=1).reshape(1, -1)
+        # create pilots and data, block after block
+        b = np.stack([self._generate_block_bits() for _ in range(h.shape[0])])
         # add zero bits
         padded_b = np.concatenate(
-            [np.zeros([b.shape[0], MEMORY_LENGTH - 1]), b, np.zeros([b.shape[0], MEMORY_LENGTH])], axis=1)
+            [np.zeros([*b.shape[:2], MEMORY_LENGTH - 1]), b, np.zeros([*b.shape[:2], MEMORY_LENGTH])], axis=2)
         if conf.modulation_type == ModulationType.QPSK.name:
             raise ValueError("Did not implement the QPSK constellation for the SISO case, switch to BPSK or MIMO!")
         # modulation
         s = MODULATION_DICT[conf.modulation_type].modulate(padded_b)
-        # transmit through noisy channel
-        rx = SISO_CHANNELS_DICT[conf.channel_model].transmit(s=s, h=h, snr=snr, memory_length=MEMORY_LENGTH)
-        symbols, rx = break_transmitted_siso_word_to_symbols(MEMORY_LENGTH, b), rx.T
-        return symbols[:-MEMORY_LENGTH + 1], rx[:-MEMORY_LENGTH + 1]
+        # transmit through noisy channel, all blocks at once
+        rx = SISO_CHANNELS_DICT[conf.channel_model].transmit(s=s, h=h, snr=snr, memory_length=MEMORY_LENGTH,
+                                                             noise_generator=self._noise_generator)
+        # break each word to its symbols, the i-th symbol holds bits i,...,i+memory_length-1 of the padded word
+        symbols = sliding_window_view(padded_b[:, 0], MEMORY_LENGTH, axis=-1)[:, :-1]
+        rx = np.swapaxes(rx, 1, 2)
+        return symbols[:, :-MEMORY_LENGTH + 1], rx[:, :-MEMORY_LENGTH + 1]
+
+    def _generate_block_bits(self) -> np.ndarray:
+        b_pilots = self._generate_all_classes_pilots()
+        b_data = self._bits_generator.integers(0, 2, size=(1, self._block_length - self._pilots_length))
+        return np.concatenate([b_pilots, b_data], axis=1).reshape(1, -1)
 
-    def _generate_all_classes_pilots(self):
-        tx_pilots = self._bits_generator.integers(0, 2, size=(1, self._pilots_length)).reshape(1, -1)
-        b_pilots_by_symbols = break_transmitted_siso_word_to_symbols(MEMORY_LENGTH, tx_pilots)
-        states = calculate_siso_states(MEMORY_LENGTH,
-                                       torch.Tensor(b_pilots_by_symbols[:-MEMORY_LENGTH + 1]).to(DEVICE)).cpu().numpy()
-        n_unique = MODULATION_NUM_MAPPING[conf.modulation_type] ** MEMORY_LENGTH
-        if len(np.unique(states)) < n_unique:
-            return self._generate_all_classes_pilots()
-        return tx_pilots
+    def _generate_all_classes_pilots(self) -> np.ndarray:
+        # the states sequence ensures that you have each state, followed by random bits
+        states_sequence = get_siso_states_sequence(MEMORY_LENGTH, self._pilots_length)
+        random_bits = self._bits_generator.integers(0, 2, size=self._pilots_length - len(states_sequence))
+        return np.concatenate([states_sequence, random_bits]).reshape(1, -1)
 
-    def get_vectors(self, snr: float, index: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    def get_vectors(self, snr: float, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Generates the blocks of the given indices at once
+        :return: tx [blocks, block_length, memory_length], h [blocks, 1, memory_length], rx [blocks, block_length, 1]
+        """
         # get channel values
-        # transmit through noisy channel
         if conf.channel_model == ChannelModels.Synthetic.name:
-            h = ISIAWGNChannel.calculate_channel(MEMORY_LENGTH, fading=conf.fading_in_channel, index=index)
+            h = ISIAWGNChannel.calculate_channels(MEMORY_LENGTH, fading=conf.fading_in_channel, indices=indices)
         elif conf.channel_model == ChannelModels.Cost2100.name:
-            h = Cost2100SISOChannel.calculate_channel(MEMORY_LENGTH, fading=conf.fading_in_channel, index=index)
+            h = Cost2100SISOChannel.calculate_channels(MEMORY_LENGTH, fading=conf.fading_in_channel, indices=indices)
         else:
             raise ValueError("No such channel model!!!")
+        # transmit through noisy channel
         tx, rx = self._transmit(h, snr)
         return tx, h, rx
@@ -0,0 +1,83 @@
+from typing import Tuple
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from python_code import DEVICE
+from python_code.channel.channels_hyperparams import MEMORY_LENGTH
+from python_code.channel.modulator import MODULATION_DICT
+from python_code.channel.siso_channels.siso_channel_dataset import SISO_CHANNELS_DICT
+from python_code.utils.config_singleton import Config
+from python_code.utils.constants import ChannelModels, ModulationType
+from python_code.utils.pilots_utils import get_siso_states_sequence
+
+conf = Config()
+
+
+def break_siso_bits_to_symbols(b: torch.Tensor) -> torch.Tensor:
+    """
+    Breaks a batch of words of bits into the symbols of the channel memory.
+    :param b: bits, [..., n]
+    :return: symbols [..., n + memory_length - 1, memory_length], the i-th symbol holds bits i,...,i+memory_length-1
+    of the zero padded word
+    """
+    padded_b = F.pad(b, (MEMORY_LENGTH - 1, MEMORY_LENGTH))
+    return padded_b.unfold(-1, MEMORY_LENGTH, 1)[..., :-1, :]
+
+
+class TorchSISOChannel:
+    """
+    Torch version of SISOChannel. Generates the blocks directly on the device in float32, with torch generators.
+    """
+
+    def __init__(self, block_length: int, pilots_length: int, bits_generator: torch.Generator,
+                 noise_generator: torch.Generator):
+        self._block_length = block_length
+        self._pilots_length = pilots_length
+        self._bits_generator = bits_generator
+        self._noise_generator = noise_generator
+
+    def _transmit(self, h: torch.Tensor, snr: float) -> Tuple[torch.Tensor, torch.Tensor]:
+        if conf.modulation_type == ModulationType.QPSK.name:
+            raise ValueError("Did not implement the QPSK constellation for the SISO case, switch to BPSK or MIMO!")
+        # create pilots and data, block after block
+        b = torch.stack([self._generate_block_bits() for _ in range(h.shape[0])])
+        # modulation of the zero padded words
+        s = MODULATION_DICT[conf.modulation_type].modulate_symbols(
+            F.pad(b, (MEMORY_LENGTH - 1, MEMORY_LENGTH)))
+        # transmit through noisy channel, all blocks at once
+        blockwise_s = s.unfold(-1, MEMORY_LENGTH, 1)[..., :-1, :]
+        conv = torch.matmul(blockwise_s, h.flip(-1).unsqueeze(-1)).squeeze(-1)
+        snr_value = 10 ** (snr / 10)
+        # the noise is drawn block after block, as when the blocks are generated one at a time
+        w = (snr_value ** (-0.5)) * torch.stack(
+            [torch.randn(conv.shape[1:], generator=self._noise_generator, device=DEVICE) for _ in range(conv.shape[0])])
+        rx = conv + w
+        if conf.channel_model == ChannelModels.Synthetic.name and not conf.linear:
+            rx = torch.tanh(rx)
+        symbols = break_siso_bits_to_symbols(b[:, 0])
+        return symbols[:, :-MEMORY_LENGTH + 1].float(), rx.transpose(1, 2)[:, :-MEMORY_LENGTH + 1]
+
+    def _generate_block_bits(self) -> torch.Tensor:
+        b_pilots = self._generate_all_classes_pilots()
+        b_data = torch.randint(0, 2, [1, self._block_length - self._pilots_length], generator=self._bits_generator,
+                               device=DEVICE)
+        return torch.cat([b_pilots, b_data], dim=1)
+
+    def _generate_all_classes_pilots(self) -> torch.Tensor:
+        # the states sequence ensures that you have each state, followed by random bits
+        states_sequence = torch.tensor(get_siso_states_sequence(MEMORY_LENGTH, self._pilots_length), device=DEVICE)
+        random_bits = torch.randint(0, 2, [self._pilots_length - len(states_sequence)], generator=self._bits_generator,
+                                    device=DEVICE)
+        return torch.cat([states_sequence, random_bits]).reshape(1, -1)
+
+    def get_vectors(self, snr: float, indices: np.ndarray) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """
+        Generates the blocks of the given indices at once
+        :return: tx [blocks, block_length, memory_length], h [blocks, 1, memory_length], rx [blocks, block_length, 1]
+        """
+        h = SISO_CHANNELS_DICT[conf.channel_model].calculate_channels(MEMORY_LENGTH, conf.fading_in_channel, indices)
+        h = torch.tensor(h, dtype=torch.float32, device=DEVICE)
+        tx, rx = self._transmit(h, snr)
+        return tx, h, rx
@@ -0,0 +1,87 @@
+import time
+
+import torch
+from torch import nn
+from torch.nn import CrossEntropyLoss
+from torch.optim import Adam
+
+from python_code import DEVICE
+from python_code.channel.channels_hyperparams import N_USER, MODULATION_NUM_MAPPING
+from python_code.detectors.deepsic.deep_sic_detector import DeepSICDetector
+from python_code.utils.config_singleton import Config
+from python_code.utils.constants import ModulationType
+
+conf = Config()
+
+# sizes of the augmented pilots set, 3000 is the one of the default QPSK setup (1000 pilots, 2 repeats)
+SAMPLES_NUMS = [500, 1500, 3000]
+STEPS = 100
+WARMUP_STEPS = 10  # untimed steps before the timed ones, so the one-time allocations are not measured
+REPEATS = 3  # the trainings alternate between the two schemes, and the fastest run of each is reported
+LR = 1e-3
+
+
+def per_user_networks() -> nn.ModuleList:
+    """
+    The networks of the users as separate modules, as they were trained before the batching - the same layers as the
+    batched detector, each user with nn.Linear layers of its own
+    """
+    layers = DeepSICDetector(1)
+    sizes = [layer.weight.shape[1:] for layer in [layers.fc0, layers.fc1, layers.fc2]]
+    return nn.ModuleList([nn.Sequential(nn.Linear(*sizes[0]), nn.Sigmoid(), nn.Linear(*sizes[1]), nn.ReLU(),
+                                        nn.Linear(*sizes[2])) for _ in range(N_USER)]).to(DEVICE)
+
+
+def train_per_user(rx: torch.Tensor, tx: torch.Tensor) -> float:
+    """
+    Trains the networks of the users one after the other, each with its own optimizer
+    :return: the training time
+    """
+    networks, criterion = per_user_networks(), CrossEntropyLoss()
+    train_time = 0
+    for user, network in enumerate(networks):
+        optimizer = Adam(network.parameters(), lr=LR)
+        for step in range(WARMUP_STEPS + STEPS):
+            if step == WARMUP_STEPS:
+                start = time.time()
+            loss = criterion(input=network(rx[user]), target=tx[user])
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+        train_time += time.time() - start
+    return train_time
+
+
+def train_batched(rx: torch.Tensor, tx: torch.Tensor) -> float:
+    """
+    Trains the networks of all the users together, as the DeepSIC trainer does
+    :return: the training time
+    """
+    detector, criterion = DeepSICDetector(N_USER).to(DEVICE), CrossEntropyLoss()
+    optimizer = Adam(detector.parameters(), lr=LR)
+    for step in range(WARMUP_STEPS + STEPS):
+        if step == WARMUP_STEPS:
+            start = time.time()
+        loss = criterion(input=detector(rx).permute(0, 2, 1), target=tx) * N_USER
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+    return time.time() - start
+
+
+if __name__ == '__main__':
+    # the batching saves the per-network overheads - the kernel launches, the autograd and the optimizer steps - but
+    # not the arithmetic. The speedup approaches N_USER only while the per-user networks are bound by the overheads, or
+    # when the batched kernels can use the cores left idle by a single small network.
+    conf.set_value('modulation_type', ModulationType.QPSK.name)
+    classes_num = MODULATION_NUM_MAPPING[conf.modulation_type]
+    input_size = DeepSICDetector(1).fc0.weight.shape[1]
+    print(f'{N_USER} users, {torch.get_num_threads()} threads, {STEPS} steps')
+    print(f"{'samples':>7} {'per-user [s]':>12} {'batched [s]':>11} {'speedup':>7}")
+    for samples_num in SAMPLES_NUMS:
+        torch.manual_seed(conf.seed)
+        rx = torch.randn([N_USER, samples_num, input_size], device=DEVICE)
+        tx = torch.randint(0, classes_num, [N_USER, samples_num], device=DEVICE)
+        runs_times = [(train_per_user(rx, tx), train_batched(rx, tx)) for _ in range(REPEATS)]
+        per_user_time, batched_time = (min(times) for times in zip(*runs_times))
+        print(f'{samples_num:>7} {per_user_time:>12.2f} {batched_time:>11.2f} {per_user_time / batched_time:>7.2f}')
@@ -1,3 +1,5 @@
+import math
+
 import torch
 from torch import nn
 
@@ -9,9 +11,31 @@ conf = Config()
 HIDDEN_BASE_SIZE = 32
 
 
+class BatchedLinear(nn.Module):
+    """
+    Stack of independent linear layers, one per model, applied with a single batched matmul.
+    Initialized as nn.Linear is.
+    """
+
+    def __init__(self, models_num: int, in_features: int, out_features: int):
+        super(BatchedLinear, self).__init__()
+        bound = 1 / math.sqrt(in_features)
+        self.weight = nn.Parameter(torch.empty(models_num, in_features, out_features).uniform_(-bound, bound))
+        self.bias = nn.Parameter(torch.empty(models_num, 1, out_features).uniform_(-bound, bound))
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        :param x: the input of each model, [models_num,batch_size,in_features]
+        :return: [models_num,batch_size,out_features]
+        """
+        return torch.baddbmm(self.bias, x, self.weight)
+
+
 class DeepSICDetector(nn.Module):
     """
-    The DeepSIC Network Architecture
+    The DeepSIC Network Architecture, of all the users at once - each layer holds the weights of every user's
+    network, stacked along a leading [n_user] dimension, so the networks are evaluated and trained together while
+    remaining independent
 
     ===========Architecture=========
     DeepSICNet(
@@ -28,19 +52,33 @@ class DeepSICDetector(nn.Module):
     probs = torch.softmax(output, dim), for a batch inference, set dim=1; otherwise dim=0.
     """
 
-    def __init__(self):
+    def __init__(self, n_user: int):
         super(DeepSICDetector, self).__init__()
         classes_num = MODULATION_NUM_MAPPING[conf.modulation_type]
         hidden_size = HIDDEN_BASE_SIZE * classes_num
         linear_input = (classes_num // 2) * N_ANT + (classes_num - 1) * (N_USER - 1)  # from DeepSIC paper
-        self.fc0 = nn.Linear(linear_input, hidden_size)
+        self.fc0 = BatchedLinear(n_user, linear_input, hidden_size)
         self.relu1 = nn.Sigmoid()
-        self.fc1 = nn.Linear(hidden_size, int(hidden_size / 2))
+        self.fc1 = BatchedLinear(n_user, hidden_size, int(hidden_size / 2))
         self.relu2 = nn.ReLU()
-        self.fc2 = nn.Linear(int(hidden_size / 2), classes_num)
+        self.fc2 = BatchedLinear(n_user, int(hidden_size / 2), classes_num)
 
-    def forward(self, rx: torch.Tensor) -> torch.Tensor:
+    @property
+    def output_layer(self) -> BatchedLinear:
+        return self.fc2
+
+    def hidden_features(self, rx: torch.Tensor) -> torch.Tensor:
+        """
+        The activations of the last hidden layer of each user's network, the input of the output layer
+        :param rx: the input of each user's network, [n_user,batch_size,linear_input]
+        :return: [n_user,batch_size,hidden_size / 2]
+        """
         out0 = self.relu1(self.fc0(rx))
-        fc1_out = self.relu2(self.fc1(out0))
-        out = self.fc2(fc1_out)
-        return out
+        return self.relu2(self.fc1(out0))
+
+    def forward(self, rx: torch.Tensor) -> torch.Tensor:
+        """
+        :param rx: the input of each user's network, [n_user,batch_size,linear_input]
+        :return: [n_user,batch_size,classes_num]
+        """
+        return self.fc2(self.hidden_features(rx))
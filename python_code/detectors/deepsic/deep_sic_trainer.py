@@ -1,7 +1,6 @@
 from typing import List
 
 import torch
-from torch import nn
 
 from python_code import DEVICE
 from python_code.channel.channels_hyperparams import N_ANT, N_USER, MODULATION_NUM_MAPPING
@@ -10,6 +9,7 @@ from python_code.detectors.deepsic.deep_sic_detector import DeepSICDetector
 from python_code.detectors.trainer import Trainer
 from python_code.utils.config_singleton import Config
 from python_code.utils.constants import HALF, ModulationType, QUARTER
+from python_code.utils.ridge_utils import one_hot_logits
 from python_code.utils.trellis_utils import prob_to_BPSK_symbol, prob_to_QPSK_symbol
 
 conf = Config()
@@ -29,6 +29,13 @@ class DeepSICTrainer(Trainer):
         self.n_user = N_USER
         self.n_ant = N_ANT
         self.lr = 1e-3
+        # the indices of all the users except k, in row k
+        self.other_users_ind = torch.LongTensor(
+            [[user_i for user_i in range(self.n_user) if user_i != k] for k in range(self.n_user)]).to(DEVICE)
+        # number of iterations whose networks were trained on the current block
+        self.trained_iterations = ITERATIONS
+        # number of iterations the detection ran, in each block
+        self.iterations_by_block = []
         super().__init__()
 
     def __str__(self):
@@ -44,49 +51,69 @@ class DeepSICTrainer(Trainer):
             raise ValueError("No such constellation!")
 
     def _initialize_detector(self):
-        self.detector = [[DeepSICDetector().to(DEVICE) for _ in range(ITERATIONS)] for _ in
-                         range(self.n_user)]  # 2D list for Storing the DeepSIC Networks
+        # list of the DeepSIC networks of each iteration, each holding the networks of all the users
+        self.detector = [DeepSICDetector(self.n_user).to(DEVICE) for _ in range(ITERATIONS)]
 
     def calc_loss(self, est: torch.Tensor, tx: torch.IntTensor) -> torch.Tensor:
         """
-        Cross Entropy loss - distribution over states versus the gt state label
+        Cross Entropy loss - distribution over states versus the gt state label.
+        Sum of the loss of each user, so each user's network gets the gradient of its own loss.
         """
-        return self.criterion(input=est, target=tx.long())
+        return self.criterion(input=est.permute(0, 2, 1), target=tx.long()) * self.n_user
 
     @staticmethod
     def preprocess(rx: torch.Tensor) -> torch.Tensor:
         if conf.modulation_type == ModulationType.BPSK.name:
             return rx.float()
         elif conf.modulation_type == ModulationType.QPSK.name:
-            y_input = torch.view_as_real(rx[:, :N_ANT]).float().reshape(rx.shape[0], -1)
-            return torch.cat([y_input, rx[:, N_ANT:].float()], dim=1)
+            return torch.view_as_real(rx).float().reshape(rx.shape[0], -1)
 
-    def train_model(self, single_model: nn.Module, tx: torch.Tensor, rx: torch.Tensor):
+    def allocate_inputs(self, rx: torch.Tensor) -> torch.Tensor:
         """
-        Trains a DeepSIC Network
+        Allocates the inputs of all the users' networks - the received word followed by the probabilities of all the
+        other users. The received word part is the same in all the iterations, so it is written here once.
+        :return: [n_user,transmission_length,input_size]
         """
-        self.optimizer = torch.optim.Adam(single_model.parameters(), lr=self.lr)
+        rx_input = self.preprocess(rx)
+        other_probs_size = (self.n_user - 1) * (MODULATION_NUM_MAPPING[conf.modulation_type] - 1)
+        inputs = torch.empty([self.n_user, rx.shape[0], rx_input.shape[1] + other_probs_size], device=DEVICE)
+        inputs[..., :rx_input.shape[1]] = rx_input
+        return inputs
+
+    def write_other_users_probs(self, inputs: torch.Tensor, probs_vec: torch.Tensor):
+        """
+        Writes the probabilities of all the other users into the inputs of each user's network, in one gather
+        """
+        other_probs = probs_vec[:, self.other_users_ind].transpose(0, 1).reshape(self.n_user, probs_vec.shape[0], -1)
+        inputs[..., -other_probs.shape[-1]:] = other_probs
+
+    def deep_learning_setup(self):
+        """
+        Sets up an optimizer for the networks of every iteration, and the loss criterion
+        """
+        self.optimizers = [torch.optim.Adam(model.parameters(), lr=self.lr) for model in self.detector]
         self.criterion = torch.nn.CrossEntropyLoss()
-        single_model = single_model.to(DEVICE)
-        loss = 0
-        y_total = self.preprocess(rx)
-        for _ in range(EPOCHS):
-            soft_estimation = single_model(y_total)
-            current_loss = self.run_train_loop(soft_estimation, tx)
-            loss += current_loss
-
-    def train_models(self, model: List[List[DeepSICDetector]], i: int, tx_all: List[torch.Tensor],
-                     rx_all: List[torch.Tensor]):
-        for user in range(self.n_user):
-            self.train_model(model[user][i], tx_all[user], rx_all[user])
+
+    def train_model(self, model: DeepSICDetector, tx: torch.Tensor, rx: torch.Tensor):
+        """
+        Trains the DeepSIC networks of all the users together
+        """
+        if self.is_fast_adapt_block:
+            self.fit_output_layer(model, rx, one_hot_logits(tx.long(), MODULATION_NUM_MAPPING[conf.modulation_type]))
+        for _ in self.training_steps(range(self.epochs_budget(EPOCHS))):
+            soft_estimation = model(rx)
+            self.run_train_loop(soft_estimation, tx)
+
+    def train_models(self, model: List[DeepSICDetector], i: int, tx_all: torch.Tensor, rx_all: torch.Tensor):
+        self.optimizer = self.optimizers[i]
+        self.train_model(model[i], tx_all, rx_all)
 
     def _online_training(self, tx: torch.Tensor, rx: torch.Tensor):
         """
         Main training function for DeepSIC trainer. Initializes the probabilities, then propagates them through the
         network, training sequentially each network and not by end-to-end manner (each one individually).
         """
-        if conf.from_scratch:
-            self._initialize_detector()
+        self.setup_online_training()
 
         if conf.modulation_type == ModulationType.BPSK.name:
             initial_probs = tx.clone()
@@ -102,7 +129,9 @@ class DeepSICTrainer(Trainer):
         else:
             raise ValueError("No such constellation!")
 
-        tx_all, rx_all = self.prepare_data_for_training(tx, rx, initial_probs)
+        # the labels and inputs of each user's network
+        tx_all, rx_all = tx.T, self.allocate_inputs(rx)
+        self.write_other_users_probs(rx_all, initial_probs)
         # Training the DeepSIC network for each user for iteration=1
         self.train_models(self.detector, 0, tx_all, rx_all)
         # Initializing the probabilities
@@ -113,19 +142,32 @@ class DeepSICTrainer(Trainer):
                 [1, 1, MODULATION_NUM_MAPPING[conf.modulation_type] - 1])
         else:
             raise ValueError("No such constellation!")
+        self.write_other_users_probs(rx_all, probs_vec)
+        self.trained_iterations = ITERATIONS
         # Training the DeepSICNet for each user-symbol/iteration
         for i in range(1, ITERATIONS):
-            # Generating soft symbols for training purposes
-            probs_vec = self.calculate_posteriors(self.detector, i, probs_vec, rx)
-            # Obtaining the DeepSIC networks for each user-symbol and the i-th iteration
-            tx_all, rx_all = self.prepare_data_for_training(tx, rx, probs_vec)
+            previous_probs_vec = probs_vec.clone()
+            # Generating soft symbols for training purposes, they are also written into the networks inputs
+            probs_vec = self.calculate_posteriors(self.detector, i, probs_vec, rx_all)
+            if conf.deepsic_train_early_exit and self.is_converged(previous_probs_vec, probs_vec):
+                # the later iterations would not change the probabilities, so their networks are not needed
+                self.trained_iterations = i
+                break
             # Training the DeepSIC networks for the iteration>1
             self.train_models(self.detector, i, tx_all, rx_all)
 
     def forward(self, rx: torch.Tensor, probs_vec: torch.Tensor = None) -> torch.Tensor:
+        # the probabilities buffer and the inputs, updated in place by each iteration
+        probs_vec = probs_vec.clone()
+        inputs = self.allocate_inputs(rx)
+        self.write_other_users_probs(inputs, probs_vec)
         # detect and decode
-        for i in range(ITERATIONS):
-            probs_vec = self.calculate_posteriors(self.detector, i + 1, probs_vec, rx)
+        for i in range(self.trained_iterations):
+            previous_probs_vec = probs_vec.clone()
+            probs_vec = self.calculate_posteriors(self.detector, i + 1, probs_vec, inputs)
+            if conf.deepsic_early_exit and self.is_converged(previous_probs_vec, probs_vec):
+                break
+        self.iterations_by_block.append(i + 1)
         if conf.modulation_type == ModulationType.BPSK.name:
             detected_word = BPSKModulator.demodulate(prob_to_BPSK_symbol(probs_vec.float()))
         elif conf.modulation_type == ModulationType.QPSK.name:
@@ -134,31 +176,26 @@ class DeepSICTrainer(Trainer):
             raise ValueError("No such constellation!")
         return detected_word
 
-    def prepare_data_for_training(self, tx: torch.Tensor, rx: torch.Tensor, probs_vec: torch.Tensor) -> [
-        torch.Tensor, torch.Tensor]:
-        """
-        Generates the data for each user
-        """
-        tx_all = []
-        rx_all = []
-        for k in range(self.n_user):
-            idx = [user_i for user_i in range(self.n_user) if user_i != k]
-            current_y_train = torch.cat((rx, probs_vec[:, idx].reshape(rx.shape[0], -1)), dim=1)
-            tx_all.append(tx[:, k])
-            rx_all.append(current_y_train)
-        return tx_all, rx_all
-
-    def calculate_posteriors(self, model: List[List[nn.Module]], i: int, probs_vec: torch.Tensor,
-                             rx: torch.Tensor) -> torch.Tensor:
-        """
-        Propagates the probabilities through the learnt networks.
-        """
-        next_probs_vec = torch.zeros(probs_vec.shape).to(DEVICE)
-        for user in range(self.n_user):
-            idx = [user_i for user_i in range(self.n_user) if user_i != user]
-            input = torch.cat((rx, probs_vec[:, idx].reshape(rx.shape[0], -1)), dim=1)
-            preprocessed_input = self.preprocess(input)
-            with torch.no_grad():
-                output = self.softmax(model[user][i - 1](preprocessed_input))
-            next_probs_vec[:, user] = output[:, 1:].reshape(next_probs_vec[:, user].shape)
-        return next_probs_vec
+    def report_blocks(self):
+        super().report_blocks()
+        print(f'DeepSIC iterations by block: {self.iterations_by_block}')
+
+    @staticmethod
+    def is_converged(previous_probs_vec: torch.Tensor, probs_vec: torch.Tensor) -> bool:
+        """
+        Whether the probabilities stopped changing between two iterations
+        """
+        return torch.mean(torch.abs(probs_vec - previous_probs_vec)).item() < conf.deepsic_exit_tolerance
+
+    def calculate_posteriors(self, model: List[DeepSICDetector], i: int, probs_vec: torch.Tensor,
+                             inputs: torch.Tensor) -> torch.Tensor:
+        """
+        Propagates the probabilities through the learnt networks, of all the users in a single batched call.
+        :param inputs: the inputs of the networks, holding the probabilities of probs_vec
+        :return: probs_vec, overwritten with the next probabilities, which are also written into the inputs
+        """
+        with torch.no_grad():
+            output = torch.softmax(model[i - 1](inputs), dim=-1)
+        probs_vec.view(probs_vec.shape[0], self.n_user, -1).copy_(output[..., 1:].transpose(0, 1))
+        self.write_other_users_probs(inputs, probs_vec)
+        return probs_vec
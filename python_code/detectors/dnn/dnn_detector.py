@@ -31,6 +31,16 @@ class DNNDetector(nn.Module):
                   nn.Linear(HIDDEN_SIZE, self.n_states)]
         self.net = nn.Sequential(*layers).to(DEVICE)
 
+    @property
+    def output_layer(self) -> nn.Linear:
+        return self.net[-1]
+
+    def hidden_features(self, rx: torch.Tensor) -> torch.Tensor:
+        """
+        The activations of the last hidden layer, the input of the output layer
+        """
+        return self.net[:-1](rx)
+
     def forward(self, rx: torch.Tensor, phase: str) -> torch.Tensor:
         out = self.net(rx)
         if phase == 'val':
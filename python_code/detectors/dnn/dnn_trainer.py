@@ -5,8 +5,10 @@ import torch
 from python_code.channel.channels_hyperparams import N_ANT, N_USER
 from python_code.detectors.dnn.dnn_detector import DNNDetector
 from python_code.detectors.trainer import Trainer
+from python_code.utils.batches_utils import ShuffledBatches
 from python_code.utils.config_singleton import Config
 from python_code.utils.constants import ModulationType
+from python_code.utils.ridge_utils import one_hot_logits
 from python_code.utils.trellis_utils import calculate_mimo_states, get_bits_from_qpsk_symbols
 
 conf = Config()
@@ -70,19 +72,26 @@ class DNNTrainer(Trainer):
         :param tx: transmitted word
         :param rx: received word
         """
-        if conf.from_scratch:
-            self._initialize_detector()
-        self.deep_learning_setup()
+        self.setup_online_training()
 
         if conf.modulation_type == ModulationType.QPSK.name:
             rx = torch.view_as_real(rx).float().reshape(rx.shape[0], -1)
 
+        if self.is_fast_adapt_block:
+            targets = one_hot_logits(calculate_mimo_states(self.n_ant, tx), self.detector.n_states)
+            self.fit_output_layer(self.detector, rx.float(), targets)
+
         # run training loops
-        loss = 0
-        for i in range(EPOCHS):
+        if conf.shuffled_training:
+            batches = ShuffledBatches(rx, tx, conf.training_batch_size)
+            epochs = self.epochs_budget(conf.training_epochs)
+            for rx_batch, tx_batch in self.training_steps(batches.iterate(epochs)):
+                soft_estimation = self.detector(rx_batch, phase='train')
+                self.run_train_loop(est=soft_estimation, tx=tx_batch)
+            return
+
+        for i in self.training_steps(range(self.epochs_budget(EPOCHS))):
             ind = randint(a=0, b=tx.shape[0] - BATCH_SIZE)
             # pass through detector
             soft_estimation = self.detector(rx[ind: ind + BATCH_SIZE].float(), phase='train')
-            current_loss = self.run_train_loop(est=soft_estimation,
-                                               tx=tx[ind:ind + BATCH_SIZE])
-            loss += current_loss
+            self.run_train_loop(est=soft_estimation, tx=tx[ind:ind + BATCH_SIZE])
@@ -0,0 +1,28 @@
+import time
+
+import torch
+
+from python_code.evaluate import CHANNEL_TYPE_TO_TRAINER_DICT
+from python_code.utils.config_singleton import Config
+
+conf = Config()
+
+FAST_ADAPT_EPOCHS = [0, 10, 50]  # number of training epochs after the refit of the output layer
+
+
+if __name__ == '__main__':
+    # the full training versus the fast adaptation, for the detectors of the configured channel type
+    results = []
+    for trainer_type in CHANNEL_TYPE_TO_TRAINER_DICT[conf.channel_type].values():
+        settings = [('full', False, 0)] + [(f'fast+{epochs}', True, epochs) for epochs in FAST_ADAPT_EPOCHS]
+        for adaptation, fast_adapt, fast_adapt_epochs in settings:
+            conf.set_value('fast_adapt', fast_adapt)
+            conf.set_value('fast_adapt_epochs', fast_adapt_epochs)
+            torch.manual_seed(conf.seed)
+            trainer = trainer_type()
+            start = time.time()
+            ser = trainer.evaluate()
+            results.append((str(trainer), adaptation, time.time() - start, ser))
+    print(f"{'detector':>12} {'adaptation':>10} {'time [s]':>9} {'ser':>8}")
+    for detector_name, adaptation, run_time, ser in results:
+        print(f'{detector_name:>12} {adaptation:>10} {run_time:>9.2f} {ser:>8.4f}')
@@ -1,5 +1,6 @@
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 
 from python_code import DEVICE
 from python_code.channel.channels_hyperparams import MEMORY_LENGTH
@@ -21,23 +22,22 @@ class RNNDetector(nn.Module):
         self.lstm = nn.LSTM(INPUT_SIZE, HIDDEN_SIZE, NUM_LAYERS).to(DEVICE)
         self.linear = nn.Linear(HIDDEN_SIZE, self.output_size).to(DEVICE)
 
-    def forward(self, rx: torch.Tensor, phase: str) -> torch.Tensor:
+    def forward(self, rx: torch.Tensor, phase: str, chunk_length: int = 0, warmup_length: int = 0) -> torch.Tensor:
         """
         The forward pass of the RNN detector
-        :param rx: input values, size [batch_size,transmission_length]
+        :param rx: input values, size [transmission_length,1], or [transmission_length,windows_num,1] for a batch of
+        windows, each starting from the zero state
         :param phase: 'train' or 'val'
-        :return: if in 'train' - the estimated bitwise prob [batch_size,transmission_length,N_CLASSES]
+        :param chunk_length: if positive, the word is split into chunks of this length that pass through the rnn as
+        one batch, instead of a single sequence
+        :param warmup_length: number of received samples before each chunk that only warm up the rnn state
+        :return: if in 'train' - the estimated bitwise prob [transmission_length,(windows_num),N_CLASSES]
         if in 'val' - the detected words [n_batch,transmission_length]
         """
-        # Set initial states
-        h_n = torch.zeros(NUM_LAYERS, 1, HIDDEN_SIZE).to(DEVICE)
-        c_n = torch.zeros(NUM_LAYERS, 1, HIDDEN_SIZE).to(DEVICE)
-
-        # Forward propagate rnn_out: tensor of shape (seq_length, batch_size, input_size)
-        rnn_out, _ = self.lstm(rx.unsqueeze(1), (h_n.contiguous(), c_n.contiguous()))
-
-        # Linear layer output
-        out = self.linear(rnn_out.squeeze(1))
+        if chunk_length > 0:
+            out = self._chunks_forward(rx, chunk_length, warmup_length)
+        else:
+            out = self._lstm_forward(rx.reshape(rx.shape[0], -1, INPUT_SIZE)).reshape(*rx.shape[:-1], -1)
         if phase == 'val':
             # Decode the output
             estimated_states = torch.argmax(out, dim=1)
@@ -45,3 +45,45 @@ class RNNDetector(nn.Module):
             return estimated_words[:, 0].reshape(-1, 1).long()
         else:
             return out
+
+    @property
+    def output_layer(self) -> nn.Linear:
+        return self.linear
+
+    def _lstm_forward(self, rx: torch.Tensor) -> torch.Tensor:
+        """
+        Runs the rnn over the sequences from the zero state
+        :param rx: [seq_length,batch_size,input_size]
+        :return: the states logits, [seq_length,batch_size,N_CLASSES]
+        """
+        # Linear layer output
+        return self.linear(self.hidden_features(rx))
+
+    def hidden_features(self, rx: torch.Tensor) -> torch.Tensor:
+        """
+        The outputs of the rnn over the sequences from the zero state, the input of the output layer
+        :param rx: [seq_length,batch_size,input_size]
+        :return: [seq_length,batch_size,HIDDEN_SIZE]
+        """
+        # Set initial states
+        h_n = torch.zeros(NUM_LAYERS, rx.shape[1], HIDDEN_SIZE).to(DEVICE)
+        c_n = torch.zeros(NUM_LAYERS, rx.shape[1], HIDDEN_SIZE).to(DEVICE)
+
+        # Forward propagate rnn_out: tensor of shape (seq_length, batch_size, hidden_size)
+        rnn_out, _ = self.lstm(rx, (h_n.contiguous(), c_n.contiguous()))
+        return rnn_out
+
+    def _chunks_forward(self, rx: torch.Tensor, chunk_length: int, warmup_length: int) -> torch.Tensor:
+        """
+        Chunk-parallel pass - each chunk is preceded by the warmup_length samples before it, and the chunks are
+        stacked along the batch dimension of the rnn. The memory of the channel is short, so after the warm-up the
+        state of the rnn is close to the one of the serial pass. The first chunk is warmed up by zeros.
+        :param rx: [transmission_length,1]
+        :return: the states logits, [transmission_length,N_CLASSES]
+        """
+        transmission_length = rx.shape[0]
+        chunks_num = -(-transmission_length // chunk_length)
+        padded_rx = F.pad(rx[:, 0], (warmup_length, chunks_num * chunk_length - transmission_length))
+        chunks = padded_rx.unfold(0, warmup_length + chunk_length, chunk_length)
+        out = self._lstm_forward(chunks.T.unsqueeze(-1))[warmup_length:]
+        return out.transpose(0, 1).reshape(-1, self.output_size)[:transmission_length]
@@ -1,11 +1,12 @@
-from random import randint
-
 import torch
 
+from python_code import DEVICE
 from python_code.channel.channels_hyperparams import MEMORY_LENGTH
 from python_code.detectors.rnn.rnn_detector import RNNDetector
 from python_code.detectors.trainer import Trainer
+from python_code.utils.batches_utils import ShuffledBatches
 from python_code.utils.config_singleton import Config
+from python_code.utils.ridge_utils import one_hot_logits
 from python_code.utils.trellis_utils import calculate_siso_states
 
 conf = Config()
@@ -39,17 +40,18 @@ class RNNTrainer(Trainer):
     def calc_loss(self, est: torch.Tensor, tx: torch.IntTensor) -> torch.Tensor:
         """
         Cross Entropy loss - distribution over states versus the gt state label
-        :param est: [1,transmission_length,n_states], each element is a probability
-        :param tx: [1, transmission_length]
+        :param est: [transmission_length,(windows_num),n_states], each element is a probability
+        :param tx: [transmission_length,(windows_num),memory_length]
         :return: loss value
         """
-        gt_states = calculate_siso_states(self.memory_length, tx)
-        loss = self.criterion(input=est, target=gt_states)
+        gt_states = calculate_siso_states(self.memory_length, tx.reshape(-1, self.memory_length))
+        loss = self.criterion(input=est.reshape(-1, self.n_states), target=gt_states)
         return loss
 
     def forward(self, rx: torch.Tensor, probs_vec: torch.Tensor = None) -> torch.Tensor:
         # detect and decode
-        detected_word = self.detector(rx.float(), phase='val')
+        detected_word = self.detector(rx.float(), phase='val', chunk_length=conf.rnn_chunk_length,
+                                      warmup_length=conf.rnn_warmup_length)
         return detected_word
 
     def _online_training(self, tx: torch.Tensor, rx: torch.Tensor):
@@ -59,18 +61,34 @@ class RNNTrainer(Trainer):
         :param tx: transmitted word
         :param rx: received word
         """
-        if conf.from_scratch:
-            self._initialize_detector()
-        self.deep_learning_setup()
+        self.setup_online_training()
 
         # run training loops
-        loss = 0
-        for i in range(EPOCHS):
-            word_ind = randint(a=0, b=conf.online_repeats_n)
-            subword_ind = randint(a=0, b=conf.pilot_size - BATCH_SIZE)
-            ind = word_ind * conf.pilot_size + subword_ind
+        words_num = rx.shape[0] // conf.pilot_size
+        if self.is_fast_adapt_block:
+            # each word of the augmented set is a sequence from the zero state, stacked along the batch dimension
+            words_length = words_num * conf.pilot_size
+            words_rx = rx[:words_length].float().reshape(words_num, conf.pilot_size, -1).transpose(0, 1)
+            words_states = calculate_siso_states(self.memory_length, tx[:words_length])
+            targets = one_hot_logits(words_states.reshape(words_num, conf.pilot_size).T, self.n_states)
+            self.fit_output_layer(self.detector, words_rx, targets)
+        if conf.shuffled_training:
+            # every window that lies within a single word of the augmented set
+            starts = (torch.arange(words_num).to(DEVICE).unsqueeze(-1) * conf.pilot_size +
+                      torch.arange(conf.pilot_size - BATCH_SIZE + 1).to(DEVICE)).reshape(-1)
+            batches = ShuffledBatches(rx, tx, conf.training_batch_size, starts=starts, window_length=BATCH_SIZE)
+            epochs = self.epochs_budget(conf.training_epochs)
+            for rx_batch, tx_batch in self.training_steps(batches.iterate(epochs)):
+                soft_estimation = self.detector(rx_batch, phase='train')
+                self.run_train_loop(est=soft_estimation, tx=tx_batch)
+            return
+
+        window_range = torch.arange(BATCH_SIZE).to(DEVICE).unsqueeze(-1)
+        for i in self.training_steps(range(self.epochs_budget(EPOCHS))):
+            # draw rnn_training_windows windows, stacked along the batch dimension of the rnn
+            word_ind = torch.randint(words_num, (conf.rnn_training_windows,)).to(DEVICE)
+            subword_ind = torch.randint(conf.pilot_size - BATCH_SIZE + 1, (conf.rnn_training_windows,)).to(DEVICE)
+            ind = window_range + word_ind * conf.pilot_size + subword_ind
             # pass through detector
-            soft_estimation = self.detector(rx[ind: ind + BATCH_SIZE].float(), phase='train')
-            current_loss = self.run_train_loop(est=soft_estimation,
-                                               tx=tx[ind:ind + BATCH_SIZE])
-            loss += current_loss
+            soft_estimation = self.detector(rx[ind].float(), phase='train')
+            self.run_train_loop(est=soft_estimation, tx=tx[ind])
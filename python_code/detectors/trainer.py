@@ -1,17 +1,20 @@
 import random
-from typing import Union
+import time
+from typing import Union, Iterable, Iterator, Tuple
 
 import numpy as np
 import torch
+from torch import nn
 from torch.nn import CrossEntropyLoss, MSELoss
 from torch.optim import RMSprop, Adam, SGD
 
 from python_code import DEVICE
-from python_code.augmentations.augmenter_wrapper import AugmenterWrapper
+from python_code.augmentations.augmenter_wrapper import AugmenterWrapper, estimate_params
 from python_code.augmentations.augmentations_plotting_utils import online_plotting
 from python_code.channel.channel_dataset import ChannelModelDataset
 from python_code.utils.config_singleton import Config
 from python_code.utils.metrics import calculate_ber
+from python_code.utils.ridge_utils import ridge_regression
 
 conf = Config()
 
@@ -20,6 +23,8 @@ torch.manual_seed(conf.seed)
 torch.cuda.manual_seed(conf.seed)
 np.random.seed(conf.seed)
 
+LOSS_SMOOTHING = 0.5  # weight of the previous smoothed loss in the moving average of the training loss
+
 
 class Trainer(object):
     """
@@ -32,6 +37,20 @@ class Trainer(object):
         self._initialize_dataloader()
         self._initialize_detector()
         self.softmax = torch.nn.Softmax(dim=1)  # Single symbol probability inference
+        # the training loss, accumulated on the device between the convergence checks
+        self.accumulated_loss = torch.zeros(1).to(DEVICE)
+        # the training steps and the last mean loss of the current block
+        self.block_steps, self.block_loss = 0, None
+        # the training steps and the final loss of every block, 0 and None for the blocks without training
+        self.steps_by_block = []
+        self.loss_by_block = []
+        # whether the current block continues the training of the previous block, in the warm start mode
+        self.is_warm_block = False
+        # whether the current block refits only the output layer of the detector, in the fast adaptation mode
+        self.is_fast_adapt_block = False
+        # the per-state statistics of the pilots of the last block the detector was trained on
+        self.previous_pilots_stats = None
+        self.retrained_blocks = []
 
     def get_name(self):
         return self.__name__()
@@ -87,12 +106,104 @@ class Trainer(object):
         """
         pass
 
+    def setup_online_training(self):
+        """
+        Prepares the detector and the optimizer for the training on the current block. A warm block continues from
+        the weights and the optimizer state of the previous block. Otherwise, a new optimizer is set up, and the
+        detector starts from scratch if conf.from_scratch is set or if this is a reset of the warm start mode, unless
+        its hidden layers are kept for the fast adaptation.
+        """
+        if self.is_warm_block:
+            return
+        if (conf.from_scratch or conf.warm_start) and not self.is_fast_adapt_block:
+            self._initialize_detector()
+        self.deep_learning_setup()
+
+    def epochs_budget(self, epochs: int) -> int:
+        """
+        The number of epochs of the current block - warm blocks train for a fraction of the full schedule, and in the
+        fast adaptation mode only conf.fast_adapt_epochs follow the refit of the output layer
+        """
+        if self.is_fast_adapt_block:
+            return conf.fast_adapt_epochs
+        if self.is_warm_block:
+            return max(1, round(epochs * conf.warm_epochs_fraction))
+        return epochs
+
+    def fit_output_layer(self, model: nn.Module, rx: torch.Tensor, targets: torch.Tensor):
+        """
+        The fast adaptation - refits the output layer of the model on the frozen hidden features of the inputs, by
+        ridge regression solved in closed form, instead of backpropagation. The hidden layers are the ones of the
+        full training on the first block.
+        :param model: a detector with hidden_features and output_layer, either nn.Linear or a batch of linear layers
+        :param rx: the model inputs
+        :param targets: the outputs the layer is fitted to, [...,samples_num,outputs_num]
+        """
+        with torch.no_grad():
+            features = model.hidden_features(rx)
+            if isinstance(model.output_layer, nn.Linear):
+                # a single problem over all the samples
+                features, targets = features.reshape(-1, features.shape[-1]), targets.reshape(-1, targets.shape[-1])
+            solution = ridge_regression(features.double(), targets.double(), conf.ridge_regularization)
+            weight, bias = solution[..., :-1, :], solution[..., -1, :]
+            if isinstance(model.output_layer, nn.Linear):
+                weight = weight.T
+            model.output_layer.weight.copy_(weight)
+            model.output_layer.bias.copy_(bias.reshape(model.output_layer.bias.shape))
+
+    def calculate_channel_change(self, rx_pilot: torch.Tensor, tx_pilot: torch.Tensor) -> Tuple[
+        Union[float, None], Tuple[torch.Tensor, torch.Tensor, torch.Tensor]]:
+        """
+        The channel change score - the squared difference of the centers of the received pilots of each state from
+        the ones of the last block the detector was trained on, over the variance of this difference under the noise,
+        averaged over the states. It is about 1 if the channel did not change, and grows with the change.
+        :return: the score, or None before the first training, and the statistics of the pilots of the current block
+        """
+        if torch.is_complex(rx_pilot):
+            rx_pilot = torch.view_as_real(rx_pilot).reshape(rx_pilot.shape[0], -1)
+        centers, stds, gt_states, n_states, _ = estimate_params(rx_pilot, tx_pilot)
+        counts = torch.bincount(gt_states, minlength=n_states).clamp(min=1).reshape(-1, *[1] * (centers.dim() - 1))
+        pilots_stats = (centers, stds, counts)
+        if self.previous_pilots_stats is None:
+            return None, pilots_stats
+        previous_centers, previous_stds, previous_counts = self.previous_pilots_stats
+        difference_variance = stds ** 2 / counts + previous_stds ** 2 / previous_counts
+        return torch.mean((centers - previous_centers) ** 2 / difference_variance).item(), pilots_stats
+
+    def track_channel_change(self, rx_pilot: torch.Tensor, tx_pilot: torch.Tensor) -> bool:
+        """
+        Tracks the channel change since the last training, for the warm start and for skipping the training on blocks
+        whose channel did not change. Both use the noise-normalized score of calculate_channel_change, which does not
+        depend on the scale of the channel. Blocks are skipped if the score is below conf.drift_threshold. In the warm
+        start mode, the training is reset in the first block and once the score crosses
+        conf.warm_start_reset_threshold (if set).
+        :return: whether the detector should be trained on the current block
+        """
+        if not conf.warm_start and not conf.skip_unchanged_blocks:
+            return True
+        channel_change, pilots_stats = self.calculate_channel_change(rx_pilot, tx_pilot)
+        if channel_change is not None:
+            print(f'Channel change: {channel_change}')
+            if conf.skip_unchanged_blocks and channel_change < conf.drift_threshold:
+                return False
+        self.previous_pilots_stats = pilots_stats
+        self.is_warm_block = conf.warm_start and channel_change is not None and \
+                             not 0 < conf.warm_start_reset_threshold < channel_change
+        return True
+
     def forward(self, rx: torch.Tensor, probs_vec: torch.Tensor = None) -> torch.Tensor:
         """
         Every trainer must have some forward pass for its detector
         """
         pass
 
+    def report_blocks(self):
+        """
+        Prints the per-block records of the evaluation run, once it is over
+        """
+        if conf.is_online_training:
+            print(f'Retrained blocks: {self.retrained_blocks}')
+
     def init_priors(self):
         """
         DeepSIC employs this initialization
@@ -107,26 +218,39 @@ class Trainer(object):
         """
         print(conf.aug_type)
         total_ser = 0
-        # draw words for a given snr
-        transmitted_words, received_words, hs = self.channel_dataset.__getitem__(snr_list=[conf.val_snr])
+        # draw words for a given snr, either all upfront or block by block
+        if conf.stream_blocks:
+            blocks = self.channel_dataset.iterate_blocks(snr=conf.val_snr, prefetch_blocks=conf.prefetch_blocks)
+        else:
+            blocks = zip(*self.channel_dataset.__getitem__(snr_list=[conf.val_snr]))
         # either None or in case of DeepSIC intializes the priors
         self.init_priors()
-        ser_by_word = np.zeros(transmitted_words.shape[0])
+        ser_by_word = np.zeros(conf.blocks_num)
         # initialize the augmentations class instance
         augmenter_wrapper = AugmenterWrapper(conf.aug_type, conf.fading_in_channel)
+        self.previous_pilots_stats = None
+        self.retrained_blocks = []
         # detect sequentially
-        for block_ind in range(conf.blocks_num):
-            # get current word and channel
-            tx, h, rx = transmitted_words[block_ind], hs[block_ind], received_words[block_ind]
+        for block_ind, (tx, rx, h) in enumerate(blocks):
             # split words into data and pilot part
             tx_pilot, tx_data = tx[:conf.pilot_size], tx[conf.pilot_size:]
             rx_pilot, rx_data = rx[:conf.pilot_size], rx[conf.pilot_size:]
-            if conf.is_online_training:
+            if conf.is_online_training and self.track_channel_change(rx_pilot, tx_pilot):
                 # augment received words by the number of desired repeats
                 augmenter_wrapper.update_hyperparams(rx_pilot, tx_pilot)
                 y_aug, x_aug = augmenter_wrapper.augment_batch(h, rx_pilot, tx_pilot)
                 # re-train the detector
+                self.block_steps, self.block_loss = 0, None
+                self.is_fast_adapt_block = conf.fast_adapt and len(self.retrained_blocks) > 0
                 self._online_training(x_aug, y_aug)
+                self.steps_by_block.append(self.block_steps)
+                self.loss_by_block.append(self.block_loss)
+                self.retrained_blocks.append(block_ind)
+                print(f'Training steps: {self.block_steps}, final loss: {self.block_loss}')
+            elif conf.is_online_training:
+                # the records stay aligned with the blocks, a skipped block trained for 0 steps with no loss
+                self.steps_by_block.append(0)
+                self.loss_by_block.append(None)
             # detect data part after training on the pilot part
             detected_word = self.forward(rx_data, self.probs_vec)
             # calculate accuracy
@@ -138,18 +262,53 @@ class Trainer(object):
             self.init_priors()
 
         total_ser /= conf.blocks_num
+        self.report_blocks()
         print(f'Final ser: {total_ser}')
         return total_ser
 
-    def run_train_loop(self, est: torch.Tensor, tx: torch.Tensor) -> float:
+    def training_steps(self, steps: Iterable) -> Iterator:
+        """
+        The training controller of a single training run. Yields the given steps, and every
+        conf.convergence_check_steps steps reads the mean loss of these steps, to stop early once the smoothed loss
+        stopped decreasing or the time budget ran out. The steps used and the last mean loss are added to the
+        records of the current block.
+        :param steps: the steps of the full training run, which is the epoch budget
+        """
+        start = time.time()
+        self.accumulated_loss.zero_()
+        steps_num, initial_loss, smoothed_loss, window_loss = 0, None, None, None
+        for step in steps:
+            yield step
+            steps_num += 1
+            if steps_num % conf.convergence_check_steps > 0:
+                continue
+            window_loss = self.accumulated_loss.item() / conf.convergence_check_steps
+            self.accumulated_loss.zero_()
+            # the budget is checked first, so that it also applies on the first check
+            if 0 < conf.training_time_budget < time.time() - start:
+                break
+            if smoothed_loss is None:
+                initial_loss = smoothed_loss = window_loss
+                continue
+            previous_loss = smoothed_loss
+            smoothed_loss = LOSS_SMOOTHING * previous_loss + (1 - LOSS_SMOOTHING) * window_loss
+            # the decrease is relative to the loss at the start of the run, so a loss that keeps shrinking towards
+            # zero is also considered converged
+            if conf.early_stopping and previous_loss - smoothed_loss < conf.convergence_tolerance * initial_loss:
+                break
+        if steps_num % conf.convergence_check_steps > 0:
+            window_loss = self.accumulated_loss.item() / (steps_num % conf.convergence_check_steps)
+        self.block_steps += steps_num
+        self.block_loss = window_loss
+
+    def run_train_loop(self, est: torch.Tensor, tx: torch.Tensor):
         # calculate loss
         loss = self.calc_loss(est=est, tx=tx)
-        current_loss = loss.item()
+        self.accumulated_loss += loss.detach()
         # back propagation
         self.optimizer.zero_grad()
         loss.backward()
         self.optimizer.step()
-        return current_loss
 
     def plot_regions(self):
         """
@@ -0,0 +1,94 @@
+import time
+from typing import Tuple
+
+import numpy as np
+import torch
+from numpy.lib.stride_tricks import sliding_window_view
+from torch.nn import CrossEntropyLoss, BCEWithLogitsLoss
+from torch.optim import Adam
+
+from python_code import DEVICE
+from python_code.channel.modulator import BPSKModulator
+from python_code.channel.siso_channels.isi_awgn_channel import ISIAWGNChannel
+from python_code.detectors.vnet.reduced_state_vnet_detector import ReducedStateVNETDetector
+from python_code.detectors.vnet.vnet_detector import VNETDetector
+from python_code.utils.config_singleton import Config
+from python_code.utils.constants import ModulationType
+from python_code.utils.metrics import calculate_ber
+from python_code.utils.trellis_utils import calculate_siso_states
+
+conf = Config()
+
+MEMORY_LENGTHS = [4, 8, 12]
+SURVIVORS_NUMS = [4, 16, 64]
+MAX_FULL_STATES = 256  # the full trellis is benchmarked up to this number of states
+PILOTS_LENGTH = 2000
+DATA_LENGTH = 10000
+SNR = 10
+EPOCHS = 300
+LR = 1e-3
+
+
+def generate_word(memory_length: int, length: int, generator: np.random.Generator) -> Tuple[
+    torch.Tensor, torch.Tensor]:
+    """
+    Transmits a random word through the synthetic ISI channel of the given memory length
+    :param generator: the generator of the bits and of the noise
+    :return: the symbols [length,memory_length] and the received word [length,1]
+    """
+    b = generator.integers(0, 2, size=(1, 1, length))
+    padded_b = np.concatenate([np.zeros([1, 1, memory_length - 1]), b, np.zeros([1, 1, memory_length])], axis=2)
+    h = ISIAWGNChannel.calculate_channels(memory_length, fading=False, indices=np.arange(1))
+    rx = ISIAWGNChannel.transmit(s=BPSKModulator.modulate(padded_b), h=h, snr=SNR, memory_length=memory_length,
+                                 noise_generator=generator)
+    symbols = sliding_window_view(padded_b[0, 0], memory_length)[:-1]
+    tx = torch.Tensor(symbols[:-memory_length + 1].copy()).to(DEVICE)
+    rx = torch.Tensor(rx[0, 0, :-memory_length + 1].copy()).reshape(-1, 1).to(DEVICE)
+    return tx, rx
+
+
+def train_detector(detector: torch.nn.Module, tx: torch.Tensor, rx: torch.Tensor, memory_length: int):
+    optimizer = Adam(detector.parameters(), lr=LR)
+    if isinstance(detector, ReducedStateVNETDetector):
+        criterion, target = BCEWithLogitsLoss(), tx
+    else:
+        criterion, target = CrossEntropyLoss(), calculate_siso_states(memory_length, tx)
+    for _ in range(EPOCHS):
+        loss = criterion(input=detector(rx, phase='train'), target=target)
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+
+
+def benchmark_detector(detector: torch.nn.Module, memory_length: int) -> Tuple[float, float, float]:
+    """
+    Trains the detector on pilots and detects a data word of the same channel
+    :return: training time, detection throughput in symbols per second, and the ber of the data word
+    """
+    generator = np.random.default_rng(conf.seed)
+    tx_pilots, rx_pilots = generate_word(memory_length, PILOTS_LENGTH, generator)
+    tx_data, rx_data = generate_word(memory_length, DATA_LENGTH, generator)
+    start = time.time()
+    train_detector(detector, tx_pilots, rx_pilots, memory_length)
+    train_time = time.time() - start
+    start = time.time()
+    with torch.no_grad():
+        detected_word = detector(rx_data, phase='val')
+    throughput = DATA_LENGTH / (time.time() - start)
+    ber = calculate_ber(detected_word, tx_data[:, :1])
+    return train_time, throughput, ber
+
+
+if __name__ == '__main__':
+    # the ViterbiNet detects BPSK words
+    conf.set_value('modulation_type', ModulationType.BPSK.name)
+    print(f"{'memory':>6} {'survivors':>9} {'train [s]':>9} {'symbols/s':>10} {'ber':>8}")
+    for memory_length in MEMORY_LENGTHS:
+        detectors = [(str(survivors_num), ReducedStateVNETDetector(memory_length, survivors_num))
+                     for survivors_num in SURVIVORS_NUMS if survivors_num < 2 ** memory_length]
+        if 2 ** memory_length <= MAX_FULL_STATES:
+            detectors.append(('all', VNETDetector(n_states=2 ** memory_length)))
+        for survivors_name, detector in detectors:
+            torch.manual_seed(conf.seed)
+            train_time, throughput, ber = benchmark_detector(detector, memory_length)
+            print(f'{memory_length:>6} {survivors_name:>9} {train_time:>9.2f} {throughput:>10.0f} {ber:>8.4f}')
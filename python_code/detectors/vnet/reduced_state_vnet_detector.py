@@ -0,0 +1,132 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from python_code import DEVICE
+from python_code.detectors.vnet.vnet_detector import HIDDEN1_SIZE, traceback
+
+
+def state_log_priors(states: torch.LongTensor, bits_log_probs: torch.Tensor) -> torch.Tensor:
+    """
+    The factorized log prior of each state - the sum of the log probabilities of its bits
+    :param states: the states, [states_num]
+    :param bits_log_probs: log probabilities of a zero bit and of a one bit at each position, [2,memory_length]
+    :return: the log priors, [states_num]
+    """
+    memory_length = bits_log_probs.shape[1]
+    bits = (states.unsqueeze(-1) >> torch.arange(memory_length, device=states.device)) & 1
+    return torch.where(bits.bool(), bits_log_probs[1], bits_log_probs[0]).sum(dim=-1)
+
+
+class ReducedStateVNETDetector(nn.Module):
+    """
+    Reduced-state ViterbiNet. The network estimates the probability of each of the memory_length bits in the state,
+    instead of the probability of each of the 2 ** memory_length states, and the decoder is the M-algorithm - only
+    the best survivors_num states are kept at each stage. Both grow linearly in the memory length.
+    A single received sample says little about each bit on its own, so the network sees the 2 * memory_length - 1
+    consecutive received samples that depend on the bits of the state.
+    """
+
+    def __init__(self, memory_length: int, survivors_num: int):
+
+        super(ReducedStateVNETDetector, self).__init__()
+        self.memory_length = memory_length
+        self.survivors_num = min(survivors_num, 2 ** memory_length)
+        self._initialize_dnn()
+
+    def _initialize_dnn(self):
+        layers = [nn.Linear(2 * self.memory_length - 1, HIDDEN1_SIZE),
+                  nn.ReLU(),
+                  nn.Linear(HIDDEN1_SIZE, self.memory_length)]
+        self.net = nn.Sequential(*layers).to(DEVICE)
+
+    @property
+    def output_layer(self) -> nn.Linear:
+        return self.net[-1]
+
+    def windows(self, rx: torch.Tensor) -> torch.Tensor:
+        """
+        The samples of the window around each stage, zero padded at the edges of the word
+        :param rx: [transmission_length,1]
+        :return: [transmission_length,2 * memory_length - 1]
+        """
+        padded_rx = F.pad(rx[:, 0], (self.memory_length - 1, self.memory_length - 1))
+        return padded_rx.unfold(0, 2 * self.memory_length - 1, 1)
+
+    def hidden_features(self, rx: torch.Tensor) -> torch.Tensor:
+        """
+        The activations of the last hidden layer, the input of the output layer
+        """
+        return self.net[:-1](self.windows(rx))
+
+    def forward(self, rx: torch.Tensor, phase: str) -> torch.Tensor:
+        """
+        The forward pass of the reduced-state ViterbiNet algorithm
+        :param rx: input values, size [transmission_length,1]
+        :param phase: 'train' or 'val'
+        :returns if in 'train' - the logits of the bits of the state [transmission_length,memory_length]
+        if in 'val' - the detected word [transmission_length,1]
+        """
+        bits_logits = self.net(self.windows(rx))
+
+        if phase == 'val':
+            with torch.no_grad():
+                bits_log_probs = torch.stack([F.logsigmoid(-bits_logits), F.logsigmoid(bits_logits)], dim=1)
+                path = self._m_algorithm(bits_log_probs)
+            # get the lsb of the state
+            detected_word = (path % 2).float().reshape(rx.shape)
+            return detected_word
+        else:
+            return bits_logits
+
+    def _initial_states(self, bits_log_probs: torch.Tensor) -> torch.LongTensor:
+        """
+        The survivors_num most probable states under the first stage priors, found bit by bit. Since the factorized
+        prior is a sum over the bits, the best states must extend the best partial states.
+        """
+        states = torch.zeros(1, dtype=torch.long, device=DEVICE)
+        scores = torch.zeros(1, device=DEVICE)
+        for k in range(self.memory_length):
+            states = torch.cat([states, states + 2 ** k])
+            scores = torch.cat([scores + bits_log_probs[0, k], scores + bits_log_probs[1, k]])
+            if len(states) > self.survivors_num:
+                top_ind = torch.topk(scores, self.survivors_num).indices
+                states, scores = states[top_ind], scores[top_ind]
+        return states
+
+    def _m_algorithm(self, bits_log_probs: torch.Tensor) -> torch.LongTensor:
+        """
+        Runs the M-algorithm over the word and traces back the best path
+        :param bits_log_probs: [transmission_length,2,memory_length]
+        :return: the state before each stage on the best path, [transmission_length]
+        """
+        transmission_length = bits_log_probs.shape[0]
+        msb = 2 ** (self.memory_length - 1)
+        states = self._initial_states(bits_log_probs[0])
+        in_prob = torch.zeros(len(states), device=DEVICE)
+        states_by_stage = torch.empty([transmission_length, self.survivors_num], dtype=torch.long, device=DEVICE)
+        parents_by_stage = torch.empty([transmission_length, self.survivors_num], dtype=torch.long, device=DEVICE)
+        for i in range(transmission_length):
+            states_by_stage[i] = states
+            cost = in_prob - state_log_priors(states, bits_log_probs[i])
+            # survivors that differ only in the lsb have the same next states, keep the cheaper one
+            next_base = states >> 1
+            order = torch.argsort(cost, stable=True)
+            order = order[torch.argsort(next_base[order], stable=True)]
+            is_first = torch.ones(len(order), dtype=torch.bool, device=DEVICE)
+            is_first[1:] = next_base[order[1:]] != next_base[order[:-1]]
+            kept = order[is_first]
+            # extend each survivor by the next bit, which is the msb of the next state
+            next_states = torch.cat([next_base[kept], next_base[kept] + msb])
+            parents = kept.repeat(2)
+            next_cost = cost[parents]
+            if len(next_states) < self.survivors_num:
+                # too few distinct states, fill with states that can never win
+                fill_num = self.survivors_num - len(next_states)
+                next_states, parents = F.pad(next_states, (0, fill_num)), F.pad(parents, (0, fill_num))
+                next_cost = F.pad(next_cost, (0, fill_num), value=float('inf'))
+            top_ind = torch.topk(next_cost, self.survivors_num, largest=False).indices
+            states, parents_by_stage[i], in_prob = next_states[top_ind], parents[top_ind], next_cost[top_ind]
+            in_prob = in_prob - in_prob.min()
+        survivors_path = traceback(parents_by_stage, torch.argmin(in_prob).item())
+        return states_by_stage.gather(1, survivors_path.unsqueeze(-1)).squeeze(-1)
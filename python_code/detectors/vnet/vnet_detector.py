@@ -1,6 +1,9 @@
+from functools import lru_cache
+
 import numpy as np
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 
 from python_code import DEVICE
 
@@ -17,21 +20,92 @@ def create_transition_table(n_states: int) -> np.ndarray:
     return transition_table
 
 
-def acs_block(in_prob: torch.Tensor, llrs: torch.Tensor, transition_table: torch.Tensor, n_states: int) -> [
+@lru_cache
+def get_transition_indices(n_states: int) -> torch.Tensor:
+    """
+    The gather indices of the trellis, built once per number of states
+    :return: the previous states of each state, [n_states,2]
+    """
+    return torch.tensor(create_transition_table(n_states), dtype=torch.long, device=DEVICE)
+
+
+def acs_block(in_prob: torch.Tensor, llrs: torch.Tensor, transition_ind: torch.Tensor) -> [
     torch.Tensor, torch.LongTensor]:
     """
     Viterbi ACS block
-    :param in_prob: last stage probabilities, [batch_size,n_states]
-    :param llrs: edge probabilities, [batch_size,1]
-    :param transition_table: transitions
-    :param n_states: number of states
-    :return: current stage probabilities, [batch_size,n_states]
+    :param in_prob: last stage probabilities, [...,n_states]
+    :param llrs: edge probabilities, broadcastable to in_prob
+    :param transition_ind: the previous states of each state, [n_states,2]
+    :return: current stage probabilities, [...,n_states], and the survivors - the column of the chosen previous state
+    in the transitions, [...,n_states]
+    """
+    trellis = (in_prob + llrs)[..., transition_ind]
+    return torch.min(trellis, dim=-1)
+
+
+def batched_viterbi(priors: torch.Tensor, transition_ind: torch.Tensor, chunk_length: int = None,
+                    in_prob: torch.Tensor = None) -> [torch.LongTensor, torch.LongTensor, torch.Tensor]:
+    """
+    Block-parallel Viterbi. The word is cut into chunks, and each stage of the recursion runs on all the chunks (and
+    all the batch) at once: first the min-plus transfer matrix of each chunk is accumulated, then the probabilities at
+    the start of each chunk are chained from chunk to chunk, and finally the ACS recursion is rerun inside all the
+    chunks from their start probabilities. This takes about 2 * sqrt(transmission_length) stages instead of
+    transmission_length stages.
+    :param priors: the estimated priors, [batch_size,transmission_length,n_states]
+    :param transition_ind: the previous states of each state, [n_states,2]
+    :param chunk_length: number of stages in each chunk, defaults to sqrt(transmission_length)
+    :param in_prob: the probabilities before the first stage, [batch_size,n_states], defaults to zeros
+    :return: the state of minimal cost before each stage, [batch_size,transmission_length], the survivors of each
+    stage, [batch_size,transmission_length,n_states], and the probabilities after the last stage, [batch_size,n_states]
+    """
+    batch_size, transmission_length, n_states = priors.shape
+    if chunk_length is None:
+        chunk_length = max(int(np.ceil(np.sqrt(transmission_length))), 1)
+    chunks_num = int(np.ceil(transmission_length / chunk_length))
+    # pad the last chunk, stages after the end do not change the ones before it
+    llrs = F.pad(-priors, (0, 0, 0, chunks_num * chunk_length - transmission_length))
+    llrs = llrs.reshape(batch_size, chunks_num, chunk_length, n_states)
+    # min-plus transfer matrix of each chunk, from the start state to the current state
+    transfer = torch.full([batch_size, chunks_num, n_states, n_states], float('inf'), device=priors.device)
+    transfer.diagonal(dim1=-2, dim2=-1).zero_()
+    for i in range(chunk_length):
+        transfer = acs_block(transfer, llrs[:, :, i].unsqueeze(-2), transition_ind)[0]
+    # chain the chunks to get the probabilities at the start of each chunk
+    start_prob = torch.zeros([batch_size, chunks_num, n_states], device=priors.device)
+    if in_prob is not None:
+        start_prob[:, 0] = in_prob
+    for c in range(chunks_num - 1):
+        start_prob[:, c + 1] = torch.min(start_prob[:, c].unsqueeze(-1) + transfer[:, c], dim=-2)[0]
+    # run the stages of all the chunks at once
+    in_prob = start_prob
+    last_stage = (transmission_length - 1) % chunk_length
+    states = torch.empty([batch_size, chunks_num, chunk_length], dtype=torch.long, device=priors.device)
+    survivors = torch.empty([batch_size, chunks_num, chunk_length, n_states], dtype=torch.long, device=priors.device)
+    for i in range(chunk_length):
+        states[:, :, i] = torch.argmin(in_prob, dim=-1)
+        in_prob, survivors[:, :, i] = acs_block(in_prob, llrs[:, :, i], transition_ind)
+        if i == last_stage:
+            out_prob = in_prob[:, -1]
+    states = states.reshape(batch_size, -1)[:, :transmission_length]
+    survivors = survivors.reshape(batch_size, -1, n_states)[:, :transmission_length]
+    return states, survivors, out_prob
+
+
+def traceback(previous_states: torch.LongTensor, last_state: int) -> torch.LongTensor:
+    """
+    Traces the survivor paths back from the given state after the last stage. Each stage maps the state after it to
+    the state before it, and these maps are composed by pointer doubling, in log(stages_num) gathers.
+    :param previous_states: the state before each stage, by the state after it, [stages_num,states_num]
+    :param last_state: the state after the last stage
+    :return: the state before each stage on the survivor path, [stages_num]
     """
-    transition_ind = transition_table.reshape(-1).repeat(in_prob.size(0)).long()
-    batches_ind = torch.arange(in_prob.size(0)).repeat_interleave(2 * n_states)
-    trellis = (in_prob + llrs)[batches_ind, transition_ind]
-    reshaped_trellis = trellis.reshape(-1, n_states, 2)
-    return torch.min(reshaped_trellis, dim=2)[0]
+    stages_num = previous_states.shape[0]
+    previous_states = previous_states.clone()
+    step = 1
+    while step < stages_num:
+        previous_states[:-step] = torch.gather(previous_states[:-step], 1, previous_states[step:])
+        step *= 2
+    return previous_states[:, last_state]
 
 
 class VNETDetector(nn.Module):
@@ -43,8 +117,7 @@ class VNETDetector(nn.Module):
 
         super(VNETDetector, self).__init__()
         self.n_states = n_states
-        self.transition_table_array = create_transition_table(n_states)
-        self.transition_table = torch.Tensor(self.transition_table_array).to(DEVICE)
+        self.transition_ind = get_transition_indices(n_states)
         self._initialize_dnn()
 
     def _initialize_dnn(self):
@@ -53,28 +126,70 @@ class VNETDetector(nn.Module):
                   nn.Linear(HIDDEN1_SIZE, self.n_states)]
         self.net = nn.Sequential(*layers).to(DEVICE)
 
+    @property
+    def output_layer(self) -> nn.Linear:
+        return self.net[-1]
+
+    def hidden_features(self, rx: torch.Tensor) -> torch.Tensor:
+        """
+        The activations of the last hidden layer, the input of the output layer
+        """
+        return self.net[:-1](rx)
+
     def forward(self, rx: torch.Tensor, phase: str) -> torch.Tensor:
         """
         The forward pass of the ViterbiNet algorithm
-        :param rx: input values, size [batch_size,transmission_length]
+        :param rx: input values, size [...,transmission_length,1], the leading dimensions are decoded as a batch
         :param phase: 'train' or 'val'
-        :returns if in 'train' - the estimated priors [batch_size,transmission_length,n_states]
-        if in 'val' - the detected words [n_batch,transmission_length]
+        :returns if in 'train' - the estimated priors [...,transmission_length,n_states]
+        if in 'val' - the detected words [...,transmission_length,1]
         """
-        # initialize input probabilities
-        in_prob = torch.zeros([1, self.n_states]).to(DEVICE)
         priors = self.net(rx)
 
         if phase == 'val':
-            detected_word = torch.zeros(rx.shape).to(DEVICE)
-            for i in range(rx.shape[0]):
-                # get the lsb of the state
-                detected_word[i] = torch.argmin(in_prob, dim=1) % 2
-                # run one Viterbi stage
-                out_prob = acs_block(in_prob, -priors[i], self.transition_table, self.n_states)
-                # update in-probabilities for next layer
-                in_prob = out_prob
-
+            # decode all the words at once, each from zero input probabilities
+            states = batched_viterbi(priors.reshape(-1, rx.shape[-2], self.n_states), self.transition_ind)[0]
+            # get the lsb of the state
+            detected_word = (states % 2).float().reshape(rx.shape)
             return detected_word
         else:
             return priors
+
+    def stream(self, rx: torch.Tensor, chunk_length: int, traceback_depth: int) -> torch.Tensor:
+        """
+        Streaming decoding of a single word. The received samples are passed through the network chunk after chunk,
+        and the survivor paths are kept for traceback_depth stages - a stage is decided once traceback_depth newer
+        stages were seen, by tracing back from the currently best state. The memory is bounded by
+        (chunk_length + traceback_depth) * n_states, regardless of the word length.
+        :param rx: input values, size [transmission_length,1]
+        :param chunk_length: number of samples passed through the network at a time
+        :param traceback_depth: number of stages each decision is delayed by
+        :return: the detected word [transmission_length,1]
+        """
+        transmission_length = rx.shape[0]
+        detected_word = torch.zeros(rx.shape).to(DEVICE)
+        in_prob = torch.zeros([1, self.n_states]).to(DEVICE)
+        # survivors of the stages that were not decided yet
+        pending_survivors = torch.empty([0, self.n_states], dtype=torch.long, device=DEVICE)
+        decided_num = 0
+        with torch.no_grad():
+            for start in range(0, transmission_length, chunk_length):
+                priors = self.net(rx[start:start + chunk_length])
+                _, survivors, in_prob = batched_viterbi(priors.unsqueeze(0), self.transition_ind, in_prob=in_prob)
+                # keep the path metrics bounded over long words, only their differences matter
+                in_prob = in_prob - in_prob.min(dim=-1, keepdim=True)[0]
+                pending_survivors = torch.cat([pending_survivors, survivors[0]])
+                # at the end of the word all the remaining stages are decided
+                if start + chunk_length >= transmission_length:
+                    to_decide_num = pending_survivors.shape[0]
+                else:
+                    to_decide_num = pending_survivors.shape[0] - traceback_depth
+                if to_decide_num <= 0:
+                    continue
+                previous_states = torch.gather(self.transition_ind.T, 0, pending_survivors)
+                path = traceback(previous_states, torch.argmin(in_prob).item())
+                # get the lsb of the state
+                detected_word[decided_num:decided_num + to_decide_num, 0] = path[:to_decide_num] % 2
+                pending_survivors = pending_survivors[to_decide_num:]
+                decided_num += to_decide_num
+        return detected_word
@@ -1,9 +1,14 @@
 import torch
+from torch.nn import BCEWithLogitsLoss
 
+from python_code import DEVICE
+from python_code.augmentations.augmenter_wrapper import estimate_params
 from python_code.channel.channels_hyperparams import MEMORY_LENGTH
 from python_code.detectors.trainer import Trainer
+from python_code.detectors.vnet.reduced_state_vnet_detector import ReducedStateVNETDetector
 from python_code.detectors.vnet.vnet_detector import VNETDetector
 from python_code.utils.config_singleton import Config
+from python_code.utils.ridge_utils import bits_logits, gaussian_log_likelihoods
 from python_code.utils.trellis_utils import calculate_siso_states
 
 conf = Config()
@@ -29,9 +34,22 @@ class VNETTrainer(Trainer):
 
     def _initialize_detector(self):
         """
-        Loads the ViterbiNet detector
+        Loads the ViterbiNet detector, or the reduced-state one with its factorized prior head
         """
-        self.detector = VNETDetector(n_states=self.n_states)
+        if conf.vnet_survivors > 0:
+            if conf.streaming_viterbi:
+                raise ValueError("The streaming decoding is only implemented for the full-state ViterbiNet, "
+                                 "set vnet_survivors to 0 or streaming_viterbi to False!")
+            self.detector = ReducedStateVNETDetector(memory_length=self.memory_length,
+                                                     survivors_num=conf.vnet_survivors)
+        else:
+            self.detector = VNETDetector(n_states=self.n_states)
+
+    def deep_learning_setup(self):
+        super().deep_learning_setup()
+        if conf.vnet_survivors > 0:
+            # the factorized head estimates each of the bits of the state
+            self.criterion = BCEWithLogitsLoss().to(DEVICE)
 
     def calc_loss(self, est: torch.Tensor, tx: torch.IntTensor) -> torch.Tensor:
         """
@@ -40,13 +58,18 @@ class VNETTrainer(Trainer):
         :param tx: [1, transmission_length]
         :return: loss value
         """
+        if conf.vnet_survivors > 0:
+            return self.criterion(input=est, target=tx)
         gt_states = calculate_siso_states(self.memory_length, tx)
         loss = self.criterion(input=est, target=gt_states)
         return loss
 
     def forward(self, rx: torch.Tensor, probs_vec: torch.Tensor = None) -> torch.Tensor:
         # detect and decode
-        detected_word = self.detector(rx.float(), phase='val')
+        if conf.streaming_viterbi:
+            detected_word = self.detector.stream(rx.float(), conf.viterbi_chunk_length, conf.traceback_depth)
+        else:
+            detected_word = self.detector(rx.float(), phase='val')
         return detected_word
 
     def _online_training(self, tx: torch.Tensor, rx: torch.Tensor):
@@ -57,14 +80,20 @@ class VNETTrainer(Trainer):
         :param rx: received word
         :param h: channel coefficients
         """
-        if conf.from_scratch:
-            self._initialize_detector()
-        self.deep_learning_setup()
+        self.setup_online_training()
+
+        if self.is_fast_adapt_block:
+            if conf.vnet_survivors > 0:
+                targets = bits_logits(tx)
+            else:
+                # the trellis sums the outputs over the stages, so they are fitted to the per-state log-likelihoods
+                # rather than to the labels
+                centers, stds, _, _, _ = estimate_params(rx, tx)
+                targets = gaussian_log_likelihoods(rx.float(), centers, stds)
+            self.fit_output_layer(self.detector, rx.float(), targets)
 
         # run training loops
-        loss = 0
-        for i in range(EPOCHS):
+        for i in self.training_steps(range(self.epochs_budget(EPOCHS))):
             # pass through detector
             soft_estimation = self.detector(rx.float(), phase='train')
-            current_loss = self.run_train_loop(est=soft_estimation, tx=tx)
-            loss += current_loss
+            self.run_train_loop(est=soft_estimation, tx=tx)
@@ -0,0 +1,68 @@
+import time
+from typing import Iterator, Tuple
+
+import torch
+
+from python_code import DEVICE
+
+
+class ShuffledBatches:
+    """
+    Shuffled epochs over the samples of the augmented set - every sample is drawn once per epoch, in a new random
+    order every epoch. The received words are converted to float once, and every batch is gathered into the same
+    preallocated buffers, so the training steps allocate no new batches.
+    A sample is either a single symbol, or a window of window_length consecutive symbols for sequence models, in
+    which case the batches are [window_length,batch_size,...].
+    """
+
+    def __init__(self, rx: torch.Tensor, tx: torch.Tensor, batch_size: int, starts: torch.LongTensor = None,
+                 window_length: int = None):
+        """
+        :param rx: received words of the augmented set
+        :param tx: transmitted words of the augmented set
+        :param batch_size: number of samples in each batch
+        :param starts: the index of the first symbol of every sample, by default every symbol
+        :param window_length: number of consecutive symbols in each sample, by default a single symbol
+        """
+        self.rx = rx.float()
+        self.tx = tx
+        self.starts = torch.arange(rx.shape[0]).to(DEVICE) if starts is None else starts
+        self.batch_size = min(batch_size, len(self.starts))
+        batch_shape = [self.batch_size] if window_length is None else [window_length, self.batch_size]
+        self.window_range = 0 if window_length is None else torch.arange(window_length).to(DEVICE).unsqueeze(-1)
+        self.ind_buffer = torch.empty(batch_shape, dtype=torch.long, device=DEVICE)
+        self.rx_buffer = torch.empty([*batch_shape, *self.rx.shape[1:]], dtype=self.rx.dtype, device=DEVICE)
+        self.tx_buffer = torch.empty([*batch_shape, *tx.shape[1:]], dtype=tx.dtype, device=DEVICE)
+
+    def __len__(self) -> int:
+        """
+        Number of batches in an epoch. The samples left over by the last full batch are skipped, and are drawn in
+        another order in the next epoch.
+        """
+        return len(self.starts) // self.batch_size
+
+    def iterate(self, epochs: int) -> Iterator[Tuple[torch.Tensor, torch.Tensor]]:
+        """
+        Yields the batches of the given number of epochs, and reports the training throughput in the end, also when
+        the training stopped early. The yielded tensors are the same buffers in every step - they are valid until the
+        next step.
+        :return: the received and transmitted batches
+        """
+        start = time.time()
+        flat_rx_buffer = self.rx_buffer.view(-1, *self.rx.shape[1:])
+        flat_tx_buffer = self.tx_buffer.view(-1, *self.tx.shape[1:])
+        batches_num = 0
+        try:
+            for _ in range(epochs):
+                permutation = torch.randperm(len(self.starts)).to(DEVICE)
+                for batch_ind in range(len(self)):
+                    batch_starts = self.starts[
+                        permutation[batch_ind * self.batch_size:(batch_ind + 1) * self.batch_size]]
+                    torch.add(batch_starts, self.window_range, out=self.ind_buffer)
+                    torch.index_select(self.rx, 0, self.ind_buffer.view(-1), out=flat_rx_buffer)
+                    torch.index_select(self.tx, 0, self.ind_buffer.view(-1), out=flat_tx_buffer)
+                    batches_num += 1
+                    yield self.rx_buffer, self.tx_buffer
+        finally:
+            samples_num = batches_num * self.batch_size
+            print(f'Training throughput: {samples_num / (time.time() - start):.0f} samples/s')
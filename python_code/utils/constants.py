@@ -27,3 +27,8 @@ class DetectorType(Enum):
 class ModulationType(Enum):
     BPSK = 'BPSK'
     QPSK = 'QPSK'
+
+
+class ChannelBackends(Enum):
+    numpy = 'numpy'
+    torch = 'torch'
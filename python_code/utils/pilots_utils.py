@@ -0,0 +1,74 @@
+from functools import lru_cache
+
+import numpy as np
+import torch
+
+from python_code import DEVICE
+from python_code.channel.channels_hyperparams import MODULATION_NUM_MAPPING
+from python_code.utils.config_singleton import Config
+from python_code.utils.trellis_utils import calculate_symbols_from_states
+
+conf = Config()
+
+
+@lru_cache
+def de_bruijn_sequence(alphabet_size: int, order: int) -> np.ndarray:
+    """
+    Cyclic de Bruijn sequence B(alphabet_size, order) - each word of length order appears exactly once as a cyclic
+    window. Built by concatenating the Lyndon words whose length divides order, in lexicographic order, so it starts
+    with order zeros.
+    :return: sequence of length alphabet_size ** order
+    """
+    sequence = []
+    word = [-1]
+    while word:
+        word[-1] += 1
+        if order % len(word) == 0:
+            sequence.extend(word)
+        word_length = len(word)
+        while len(word) < order:
+            word.append(word[-word_length])
+        while word and word[-1] == alphabet_size - 1:
+            word.pop()
+    return np.array(sequence)
+
+
+def calculate_min_siso_pilots_length(memory_length: int) -> int:
+    """
+    The minimal pilot_size in which all the 2 ** memory_length siso states appear - one pilot bit per state
+    """
+    return 2 ** memory_length
+
+
+def calculate_min_mimo_pilots_length(n_user: int) -> int:
+    """
+    The minimal pilot_size (in bits) in which all the mimo states appear - one pilot symbol per state
+    """
+    n_states = MODULATION_NUM_MAPPING[conf.modulation_type] ** n_user
+    return n_states * MODULATION_NUM_MAPPING[conf.modulation_type] // 2
+
+
+def get_siso_states_sequence(memory_length: int, pilots_length: int) -> np.ndarray:
+    """
+    The bits that lead the siso pilots, such that the pilots contain all the states in a single pass. This is the de
+    Bruijn sequence of the states, rotated such that its leading zeros are supplied by the zero padding of the word.
+    The rest of the pilots are random bits.
+    :return: bits sequence of length calculate_min_siso_pilots_length(memory_length)
+    """
+    min_pilots_length = calculate_min_siso_pilots_length(memory_length)
+    if pilots_length < min_pilots_length:
+        raise ValueError(f"pilot_size must be at least {min_pilots_length} to contain all the siso states!")
+    return np.roll(de_bruijn_sequence(2, memory_length), -(memory_length - 1))
+
+
+def get_mimo_states_symbols(n_user: int, pilots_length: int) -> torch.Tensor:
+    """
+    The symbols that lead the mimo pilots, such that the pilots contain all the states - each state in order.
+    The rest of the pilots are random symbols.
+    :return: symbols of the states, [n_states, n_user]
+    """
+    min_pilots_length = calculate_min_mimo_pilots_length(n_user)
+    if pilots_length < min_pilots_length:
+        raise ValueError(f"pilot_size must be at least {min_pilots_length} to contain all the mimo states!")
+    n_states = MODULATION_NUM_MAPPING[conf.modulation_type] ** n_user
+    return calculate_symbols_from_states(n_user, torch.arange(n_states).to(DEVICE))
@@ -0,0 +1,52 @@
+import torch
+import torch.nn.functional as F
+
+TARGETS_SMOOTHING = 0.01  # the probability mass of the wrong classes in the regression targets
+
+
+def ridge_regression(features: torch.Tensor, targets: torch.Tensor, regularization: float) -> torch.Tensor:
+    """
+    Closed form regularized least squares fit of an affine map from the features to the targets, by the normal
+    equations. The leading dimensions are independent problems, solved as a batch.
+    :param features: [...,samples_num,features_num]
+    :param targets: [...,samples_num,targets_num]
+    :param regularization: the weight of the squared norm of the weights, the bias is not regularized
+    :return: the weights followed by the bias in the last row, [...,features_num + 1,targets_num]
+    """
+    features = F.pad(features, (0, 1), value=1)
+    gram = features.transpose(-1, -2) @ features
+    penalty = torch.full([features.shape[-1]], regularization, dtype=gram.dtype, device=gram.device)
+    penalty[-1] = 0
+    return torch.linalg.solve(gram + torch.diag(penalty), features.transpose(-1, -2) @ targets)
+
+
+def one_hot_logits(labels: torch.Tensor, classes_num: int) -> torch.Tensor:
+    """
+    The regression targets of classification outputs - the log of the one-hot labels, smoothed by TARGETS_SMOOTHING
+    such that they are finite. As the outputs are used as logits, fitting them in the log domain keeps their scale.
+    :param labels: class indices, [...]
+    :return: [...,classes_num]
+    """
+    one_hot = F.one_hot(labels, classes_num).float()
+    return torch.log(one_hot * (1 - TARGETS_SMOOTHING) + (1 - one_hot) * TARGETS_SMOOTHING / (classes_num - 1))
+
+
+def gaussian_log_likelihoods(rx: torch.Tensor, centers: torch.Tensor, stds: torch.Tensor) -> torch.Tensor:
+    """
+    The regression targets of likelihood outputs - the log-likelihood of each received sample under the gaussian of
+    every state, up to a constant
+    :param rx: received samples, [samples_num,1]
+    :param centers: the center of each state, [n_states,1]
+    :param stds: the std of each state, [n_states,1]
+    :return: [samples_num,n_states]
+    """
+    return -(rx - centers.T) ** 2 / (2 * stds.T ** 2) - torch.log(stds.T)
+
+
+def bits_logits(bits: torch.Tensor) -> torch.Tensor:
+    """
+    The regression targets of bitwise logits outputs - the logits of the bits, smoothed by TARGETS_SMOOTHING
+    :param bits: 0/1 values
+    :return: the logits, the same shape as bits
+    """
+    return (2 * bits - 1) * torch.log(torch.tensor((1 - TARGETS_SMOOTHING) / TARGETS_SMOOTHING))
@@ -0,0 +1,28 @@
+from functools import lru_cache
+
+import torch
+
+from python_code import DEVICE
+
+
+@lru_cache
+def get_states_enumerator(constellation_size: int, state_size: int, dtype: torch.dtype = torch.float) -> torch.Tensor:
+    """
+    The symbol-to-state weights - the state of a word of symbols s_0,...,s_(state_size-1) is their dot product with
+    the weights, sum of s_i * constellation_size ** i.
+    :param dtype: float weights are exact up to 2 ** 24 states, an integer type is needed for more states
+    :return: weights, [1, state_size]
+    """
+    return (constellation_size ** torch.arange(state_size)).reshape(1, -1).to(device=DEVICE, dtype=dtype)
+
+
+@lru_cache
+def get_states_symbols_table(constellation_size: int, state_size: int) -> torch.Tensor:
+    """
+    The state-to-symbol matrix - the i-th row holds the symbols of state i, s.t. the first symbol is the least
+    significant digit of i in base constellation_size.
+    :return: long matrix, [constellation_size ** state_size, state_size]
+    """
+    states = torch.arange(constellation_size ** state_size).unsqueeze(-1)
+    digits_weights = constellation_size ** torch.arange(state_size)
+    return ((states // digits_weights) % constellation_size).to(DEVICE)
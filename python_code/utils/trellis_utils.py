@@ -1,12 +1,10 @@
-import itertools
-
 import numpy as np
 import torch
 
-from python_code import DEVICE
 from python_code.channel.channels_hyperparams import MODULATION_NUM_MAPPING
 from python_code.utils.config_singleton import Config
-from python_code.utils.constants import HALF, ModulationType
+from python_code.utils.constants import HALF
+from python_code.utils.states_tables import get_states_enumerator, get_states_symbols_table
 
 conf = Config()
 
@@ -19,7 +17,7 @@ def calculate_siso_states(memory_length: int, transmitted_words: torch.Tensor) -
     :param transmitted_words: channel transmitted words
     :return: vector of length of transmitted_words with values in the range of 0,1,...,n_states-1
     """
-    states_enumerator = (2 ** torch.arange(memory_length)).reshape(1, -1).float().to(DEVICE)
+    states_enumerator = get_states_enumerator(2, memory_length)
     gt_states = torch.sum(transmitted_words * states_enumerator, dim=1).long()
     return gt_states
 
@@ -32,8 +30,9 @@ def calculate_mimo_states(n_user: int, transmitted_words: torch.Tensor) -> torch
     :param transmitted_words: channel transmitted words
     :return: vector of length of transmitted_words with values in the range of 0,1,...,n_states-1
     """
-    states_enumerator = (MODULATION_NUM_MAPPING[conf.modulation_type] ** torch.arange(n_user)).to(DEVICE)
-    gt_states = torch.sum(transmitted_words * states_enumerator, dim=1).long()
+    # integer weights, as with QPSK the float ones are exact only up to 12 users
+    states_enumerator = get_states_enumerator(MODULATION_NUM_MAPPING[conf.modulation_type], n_user, torch.long)
+    gt_states = torch.sum(transmitted_words.long() * states_enumerator, dim=1)
     return gt_states
 
 
@@ -41,34 +40,7 @@ def calculate_symbols_from_states(state_size: int, gt_states: torch.Tensor) -> t
     """
     Used for the dnn-aided receivers. Calculates the symbols from the states to feed as labels.
     """
-    mask = MODULATION_NUM_MAPPING[conf.modulation_type] ** torch.arange(state_size).to(DEVICE, gt_states.dtype)
-    if conf.modulation_type == ModulationType.BPSK.name:
-        return gt_states.unsqueeze(-1).bitwise_and(mask).ne(0).long()
-    elif conf.modulation_type == ModulationType.QPSK.name:
-        result = (gt_states.unsqueeze(-1) // mask) % MODULATION_NUM_MAPPING[conf.modulation_type]
-        return result
-
-
-def break_transmitted_siso_word_to_symbols(memory_length: int, transmitted_words: np.ndarray) -> np.ndarray:
-    """
-    Take words of bits b_0,..b_(n-1) with length n, and creates [memory_length X n-memory_length] matrix
-    with bits b_0,..., b_(n-1-memory_length) at first row, bits b_1,..., b_(n-1-memory_length+1) at second row
-    up to memory_length such rows
-    """
-    padded = np.concatenate([np.zeros([transmitted_words.shape[0], memory_length - 1]), transmitted_words,
-                             np.zeros([transmitted_words.shape[0], memory_length])], axis=1)
-    unsqueezed_padded = np.expand_dims(padded, axis=1)
-    blockwise_words = np.concatenate([unsqueezed_padded[:, :, i:-memory_length + i] for i in range(memory_length)],
-                                     axis=1)
-    return blockwise_words.squeeze().T
-
-
-def generate_bits_by_state(state: int, n_state: int) -> torch.Tensor:
-    """
-    Calculates all possible combinations of vector of length state, with elements from 0,..,n_states-1
-    """
-    combinations = list(itertools.product(range(MODULATION_NUM_MAPPING[conf.modulation_type]), repeat=n_state))
-    return torch.Tensor(combinations[state][::-1]).reshape(1, n_state).to(DEVICE)
+    return get_states_symbols_table(MODULATION_NUM_MAPPING[conf.modulation_type], state_size)[gt_states.long()]
 
 
 def prob_to_BPSK_symbol(p: torch.Tensor) -> torch.Tensor:
@@ -99,7 +71,7 @@ def prob_to_QPSK_symbol(p: torch.Tensor) -> torch.Tensor:
 
 
 def get_qpsk_symbols_from_bits(b: np.ndarray) -> np.ndarray:
-    return b[::2] + 2 * b[1::2]
+    return b[..., ::2, :] + 2 * b[..., 1::2, :]
 
 
 def get_bits_from_qpsk_symbols(target: torch.Tensor) -> torch.Tensor:
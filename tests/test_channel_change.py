@@ -0,0 +1,61 @@
+import pytest
+
+from python_code.channel.channel_dataset import ChannelModelDataset
+from python_code.detectors.trainer import Trainer
+from python_code.utils.config_singleton import Config
+from python_code.utils.constants import ChannelBackends
+
+conf = Config()
+
+BLOCK_LENGTH = 800
+PILOTS_LENGTH = 400
+BLOCKS_NUM = 20
+SNR = 10
+
+
+@pytest.fixture(params=[('SISO', 'BPSK'), ('MIMO', 'BPSK')])
+def static_blocks(request, monkeypatch):
+    channel_type, modulation_type = request.param
+    monkeypatch.setattr(conf, 'channel_backend', ChannelBackends.numpy.name)
+    monkeypatch.setattr(conf, 'channel_type', channel_type)
+    monkeypatch.setattr(conf, 'modulation_type', modulation_type)
+    monkeypatch.setattr(conf, 'channel_model', 'Synthetic')
+    monkeypatch.setattr(conf, 'fading_in_channel', False)
+    monkeypatch.setattr(conf, 'cache_datasets', False)
+    dataset = ChannelModelDataset(block_length=BLOCK_LENGTH, pilots_length=PILOTS_LENGTH, blocks_num=BLOCKS_NUM)
+    tx, rx, _ = dataset.__getitem__(snr_list=[SNR])
+    return tx[:, :PILOTS_LENGTH], rx[:, :PILOTS_LENGTH]
+
+
+def test_unchanged_channel_scores_about_one(static_blocks):
+    tx, rx = static_blocks
+    trainer = Trainer()
+    scores = []
+    for block_ind in range(BLOCKS_NUM):
+        channel_change, trainer.previous_pilots_stats = trainer.calculate_channel_change(rx[block_ind], tx[block_ind])
+        if channel_change is not None:
+            scores.append(channel_change)
+    mean_score = sum(scores) / len(scores)
+    assert 0.8 < mean_score < 1.25
+    assert mean_score < conf.drift_threshold
+
+
+def test_changed_channel_scores_above_the_drift_threshold(static_blocks):
+    tx, rx = static_blocks
+    trainer = Trainer()
+    _, trainer.previous_pilots_stats = trainer.calculate_channel_change(rx[0], tx[0])
+    channel_change, _ = trainer.calculate_channel_change(1.5 * rx[1], tx[1])
+    assert channel_change > conf.drift_threshold
+
+
+def test_warm_start_resets_on_an_abrupt_change(static_blocks, monkeypatch):
+    tx, rx = static_blocks
+    monkeypatch.setattr(conf, 'warm_start', True)
+    monkeypatch.setattr(conf, 'skip_unchanged_blocks', False)
+    monkeypatch.setattr(conf, 'warm_start_reset_threshold', 10 * conf.drift_threshold)
+    trainer = Trainer()
+    is_warm_blocks = []
+    for block_rx, block_tx in [(rx[0], tx[0]), (rx[1], tx[1]), (1.5 * rx[2], tx[2])]:
+        assert trainer.track_channel_change(block_rx, block_tx)
+        is_warm_blocks.append(trainer.is_warm_block)
+    assert is_warm_blocks == [False, True, False]
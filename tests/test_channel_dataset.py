@@ -0,0 +1,49 @@
+import pytest
+import torch
+
+from python_code.channel.channel_dataset import ChannelModelDataset
+from python_code.utils.config_singleton import Config
+from python_code.utils.constants import ChannelBackends
+
+conf = Config()
+
+BLOCK_LENGTH = 1200
+PILOTS_LENGTH = 600
+BLOCKS_NUM = 4
+SNR = 10
+NOISE_TOLERANCE = 1e-4  # the received words are float32
+
+
+@pytest.mark.parametrize('channel_backend', [ChannelBackends.numpy.name, ChannelBackends.torch.name])
+@pytest.mark.parametrize('channel_type, modulation_type', [('SISO', 'BPSK'), ('MIMO', 'BPSK'), ('MIMO', 'QPSK')])
+def test_streamed_blocks_match_the_dataset(channel_backend, channel_type, modulation_type, monkeypatch):
+    monkeypatch.setattr(conf, 'channel_backend', channel_backend)
+    monkeypatch.setattr(conf, 'channel_type', channel_type)
+    monkeypatch.setattr(conf, 'modulation_type', modulation_type)
+    monkeypatch.setattr(conf, 'channel_model', 'Synthetic')
+    monkeypatch.setattr(conf, 'fading_in_channel', True)
+    monkeypatch.setattr(conf, 'cache_datasets', False)
+    dataset = ChannelModelDataset(block_length=BLOCK_LENGTH, pilots_length=PILOTS_LENGTH, blocks_num=BLOCKS_NUM)
+    tx, rx, h = dataset.__getitem__(snr_list=[SNR])
+    blocks = list(dataset.iterate_blocks(snr=SNR))
+    assert len(blocks) == BLOCKS_NUM
+    for block_ind, (block_tx, block_rx, block_h) in enumerate(blocks):
+        assert torch.equal(block_tx, tx[block_ind])
+        assert torch.equal(block_rx, rx[block_ind])
+        assert torch.equal(block_h, h[block_ind])
+
+
+def test_siso_noise_changes_between_blocks_and_snrs(monkeypatch):
+    monkeypatch.setattr(conf, 'channel_backend', ChannelBackends.numpy.name)
+    monkeypatch.setattr(conf, 'channel_type', 'SISO')
+    monkeypatch.setattr(conf, 'modulation_type', 'BPSK')
+    monkeypatch.setattr(conf, 'channel_model', 'Synthetic')
+    monkeypatch.setattr(conf, 'linear', True)
+    monkeypatch.setattr(conf, 'cache_datasets', False)
+    dataset = ChannelModelDataset(block_length=BLOCK_LENGTH, pilots_length=PILOTS_LENGTH, blocks_num=BLOCKS_NUM)
+    tx, rx, h = dataset.__getitem__(snr_list=[SNR, SNR + 1])
+    # subtract the noiseless received words, each symbol holds the bits of the channel taps in the reversed order
+    noise = rx.squeeze(-1) - ((1 - 2 * tx) * h.flip(-1)).sum(-1)
+    assert not torch.allclose(noise[0], noise[1], atol=NOISE_TOLERANCE)
+    snr_ratio = 10 ** (1 / 20)
+    assert not torch.allclose(noise[0], snr_ratio * noise[BLOCKS_NUM], atol=NOISE_TOLERANCE)
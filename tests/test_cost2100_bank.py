@@ -0,0 +1,113 @@
+import os
+from functools import partial
+
+import numpy as np
+import pytest
+import scipy.io
+
+from python_code.channel import cost2100_bank
+from python_code.channel.channels_hyperparams import MEMORY_LENGTH, N_ANT, N_USER
+from python_code.channel.mimo_channels import cost_mimo_channel
+from python_code.channel.mimo_channels.cost_mimo_channel import Cost2100MIMOChannel, SCALING_COEF
+from python_code.channel.siso_channels import cost_siso_channel
+from python_code.channel.siso_channels.cost_siso_channel import Cost2100SISOChannel, COST_LENGTH, COST_STEP
+
+MAX_FRAMES = cost2100_bank.MAX_FRAMES
+TRAJECTORY_LENGTH = 300
+FOLDERS_NUM = 2
+
+
+@pytest.fixture
+def siso_dir(tmp_path):
+    siso_dir = tmp_path / 'SISO'
+    siso_dir.mkdir()
+    rng = np.random.default_rng(0)
+    for i in range(MEMORY_LENGTH):
+        scipy.io.savemat(siso_dir / f'h_{i}.mat', {'h_channel_response_mag': rng.random([1, TRAJECTORY_LENGTH])})
+    return str(siso_dir)
+
+
+@pytest.fixture
+def mimo_dir(tmp_path):
+    mimo_dir = tmp_path / 'MIMO'
+    rng = np.random.default_rng(1)
+    for folder in range(1, FOLDERS_NUM + 1):
+        (mimo_dir / f'{folder}').mkdir(parents=True)
+        for user in range(1, N_USER + 1):
+            scipy.io.savemat(mimo_dir / f'{folder}' / f'h_{user}.mat', {'norm_channel': rng.random([MAX_FRAMES, N_ANT])})
+    return str(mimo_dir)
+
+
+def loadmat_siso_channels(siso_dir: str, memory_length: int, indices: np.ndarray) -> np.ndarray:
+    """
+    The taps loading by loadmat, before the bank
+    """
+    total_h = np.empty([COST_LENGTH // COST_STEP, memory_length])
+    for i in range(memory_length):
+        h_channel_response = scipy.io.loadmat(os.path.join(siso_dir, f'h_{i}'))
+        total_h[:, i] = h_channel_response['h_channel_response_mag'].reshape(-1)[:COST_LENGTH][::COST_STEP]
+    h = np.reshape(total_h[indices], [-1, 1, memory_length])
+    h *= 0.8
+    return h
+
+
+def loadmat_mimo_channels(mimo_dir: str, n_ant: int, n_user: int, frame_inds: np.ndarray) -> np.ndarray:
+    """
+    The users loading by loadmat, before the bank
+    """
+    total_h = np.empty([len(frame_inds), n_user, n_ant])
+    main_folders = 1 + (frame_inds // MAX_FRAMES)
+    for main_folder in np.unique(main_folders):
+        cur_frames = main_folders == main_folder
+        for i in range(1, n_user + 1):
+            path_to_mat = os.path.join(mimo_dir, f'{main_folder}', f'h_{i}.mat')
+            h_user = scipy.io.loadmat(path_to_mat)['norm_channel'][frame_inds[cur_frames] % MAX_FRAMES, :N_USER]
+            total_h[cur_frames, i - 1] = SCALING_COEF * h_user
+    total_h[:, np.arange(n_user), np.arange(n_user)] = 1
+    return total_h
+
+
+def test_siso_bank_matches_loadmat(siso_dir, tmp_path, monkeypatch):
+    banks_dir = str(tmp_path / 'banks')
+    monkeypatch.setattr(cost_siso_channel, 'load_siso_bank',
+                        partial(cost2100_bank.load_siso_bank, siso_dir, banks_dir))
+    indices = np.array([0, 3, 7, 42, COST_LENGTH // COST_STEP - 1])
+    h = Cost2100SISOChannel.calculate_channels(MEMORY_LENGTH, fading=True, indices=indices)
+    assert np.array_equal(h, loadmat_siso_channels(siso_dir, MEMORY_LENGTH, indices))
+
+
+def test_mimo_bank_matches_loadmat(mimo_dir, tmp_path, monkeypatch):
+    banks_dir = str(tmp_path / 'banks')
+    monkeypatch.setattr(cost_mimo_channel, 'load_mimo_bank',
+                        partial(cost2100_bank.load_mimo_bank, mimo_dir, banks_dir))
+    frame_inds = np.array([0, 5, MAX_FRAMES - 1, MAX_FRAMES, 2 * MAX_FRAMES - 1])
+    h = Cost2100MIMOChannel.calculate_channels(N_ANT, N_USER, frame_inds, fading=True)
+    assert np.array_equal(h, loadmat_mimo_channels(mimo_dir, N_ANT, N_USER, frame_inds))
+
+
+def test_bank_is_written_outside_the_sources(siso_dir, tmp_path):
+    banks_dir = str(tmp_path / 'banks')
+    cost2100_bank.load_siso_bank(siso_dir, banks_dir)
+    assert os.path.isfile(cost2100_bank.get_bank_path(siso_dir, banks_dir))
+    assert not any(file_name.endswith('.npy') for file_name in os.listdir(siso_dir))
+
+
+def test_bank_is_rebuilt_after_the_sources_change(siso_dir, tmp_path):
+    banks_dir = str(tmp_path / 'banks')
+    old_bank = np.array(cost2100_bank.load_siso_bank(siso_dir, banks_dir))
+    new_taps = np.ones([1, TRAJECTORY_LENGTH])
+    tap_path = os.path.join(siso_dir, 'h_0.mat')
+    scipy.io.savemat(tap_path, {'h_channel_response_mag': new_taps})
+    # make the source strictly newer than the bank, regardless of the file system time resolution
+    bank_time = os.path.getmtime(cost2100_bank.get_bank_path(siso_dir, banks_dir))
+    os.utime(tap_path, (bank_time + 1, bank_time + 1))
+    new_bank = cost2100_bank.load_siso_bank(siso_dir, banks_dir)
+    assert np.array_equal(new_bank[0], new_taps[0])
+    assert np.array_equal(new_bank[1:], old_bank[1:])
+
+
+def test_short_mimo_folder_is_rejected(mimo_dir, tmp_path):
+    path_to_mat = os.path.join(mimo_dir, '1', 'h_1.mat')
+    scipy.io.savemat(path_to_mat, {'norm_channel': np.ones([MAX_FRAMES - 1, N_ANT])})
+    with pytest.raises(ValueError):
+        cost2100_bank.convert_mimo_bank(mimo_dir, str(tmp_path / 'banks'))